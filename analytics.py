@@ -0,0 +1,257 @@
+"""Structured analytics endpoints over `assessments` — no LLM involved.
+
+Fixed dashboard views (state summaries, status trend, top-N places) are served
+from parameterized SQL. State summaries and trends are precomputed for every
+state in one grouped query per data version; top-N results are cached per
+parameter set. Every response carries an ETag derived from the data version
+and body, so clients revalidate with If-None-Match and get 304s until the data
+changes.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlalchemy import text
+
+import rag_pipeline
+
+router = APIRouter(prefix="/api")
+
+MAX_TOP_N = 100
+MAX_CACHED_QUERIES = 512
+
+# Aggregate expression per metric, applied over the rows of one place.
+METRICS: Dict[str, str] = {
+    "groundwater_used_total": "SUM(groundwater_used_total)",
+    "groundwater_refilled_total": "SUM(groundwater_refilled_total)",
+    "rainfall": "AVG(rainfall)",
+    "stage_of_extraction": "SUM(groundwater_used_total) * 100.0 / NULLIF(SUM(groundwater_refilled_total), 0)",
+    "land_irrigated": "SUM(land_irrigated)",
+    "irrigated_pct": "SUM(land_irrigated) * 100.0 / NULLIF(SUM(land_total), 0)",
+}
+Metric = Literal[
+    "groundwater_used_total",
+    "groundwater_refilled_total",
+    "rainfall",
+    "stage_of_extraction",
+    "land_irrigated",
+    "irrigated_pct",
+]
+
+SUMMARY_COLUMNS = f"""
+    COUNT(*) AS records,
+    COUNT(DISTINCT place) AS places,
+    AVG(rainfall) AS avg_rainfall,
+    SUM(groundwater_used_total) AS groundwater_used_total,
+    SUM(groundwater_refilled_total) AS groundwater_refilled_total,
+    {METRICS["stage_of_extraction"]} AS stage_of_extraction,
+    {METRICS["irrigated_pct"]} AS irrigated_pct
+"""
+
+
+# --------------------------------------------------------------------------
+# CACHE
+# --------------------------------------------------------------------------
+class VersionedCache:
+    """Serialized responses keyed by (data version, view, params).
+
+    Entries from an older data version are dropped wholesale on the first
+    lookup after the version changes.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_QUERIES):
+        self.max_entries = max_entries
+        self._version: Optional[str] = None
+        self._entries: "OrderedDict[Tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Tuple, build: Callable[[str], Any]) -> Tuple[str, bytes]:
+        version = rag_pipeline.data_version()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                return hit
+
+        body = json.dumps(build(version), default=str, separators=(",", ":")).encode()
+        etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (etag, body)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+
+_cache = VersionedCache()
+
+# Precomputed per-version views: {version: {...}}
+_precomputed: Dict[str, Dict[str, Any]] = {}
+_precompute_lock = threading.Lock()
+
+
+def _rounded(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()}
+
+
+def _fetch(sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    with rag_pipeline.get_engine().connect() as conn:
+        return [_rounded(dict(r._mapping)) for r in conn.execute(text(sql), params or {})]
+
+
+def _views(version: str) -> Dict[str, Any]:
+    """State summaries and status trends for every state, computed once per version."""
+    views = _precomputed.get(version)
+    if views is not None:
+        return views
+
+    with _precompute_lock:
+        if version in _precomputed:
+            return _precomputed[version]
+
+        summaries: Dict[str, Dict[str, Any]] = {}
+        for row in _fetch(f"""
+            SELECT state, year, {SUMMARY_COLUMNS}
+            FROM assessments
+            GROUP BY GROUPING SETS ((state), (state, year))
+            ORDER BY state, year NULLS FIRST
+        """):
+            state, year = row.pop("state"), row.pop("year")
+            if state is None:
+                continue
+            entry = summaries.setdefault(state.lower(), {"state": state, "by_year": []})
+            if year is None:
+                entry.update(row)
+            else:
+                entry["by_year"].append({"year": year, **row})
+
+        trends: Dict[Optional[str], Dict[int, Dict[str, int]]] = {}
+        for row in _fetch("""
+            SELECT state, year, groundwater_status, COUNT(*) AS n
+            FROM assessments
+            GROUP BY GROUPING SETS ((state, year, groundwater_status), (year, groundwater_status))
+        """):
+            key = row["state"].lower() if row["state"] else None
+            counts = trends.setdefault(key, {}).setdefault(row["year"], {})
+            counts[row["groundwater_status"]] = row["n"]
+            if key is not None and key in summaries:
+                summaries[key].setdefault("status_counts", {})
+                totals = summaries[key]["status_counts"]
+                totals[row["groundwater_status"]] = totals.get(row["groundwater_status"], 0) + row["n"]
+
+        views = {"summaries": summaries, "trends": trends}
+        _precomputed.clear()
+        _precomputed[version] = views
+        return views
+
+
+def warm() -> None:
+    """Build the precomputed views for the current data version."""
+    _views(rag_pipeline.data_version())
+
+
+rag_pipeline.on_reload(lambda version: _views(version))
+
+
+# --------------------------------------------------------------------------
+# RESPONSES
+# --------------------------------------------------------------------------
+def _respond(request: Request, key: Tuple, build: Callable[[str], Any]) -> Response:
+    etag, body = _cache.get_or_build(key, build)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in match.split(",")] or match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/stats/state/{state}")
+def state_stats(state: str, request: Request):
+    """Totals, ratios, status counts and per-year breakdown for one state."""
+    def build(version: str):
+        summary = _views(version)["summaries"].get(state.strip().lower())
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"unknown state '{state}'")
+        return summary
+
+    return _respond(request, ("state", state.strip().lower()), build)
+
+
+@router.get("/stats/states")
+def list_states(request: Request):
+    """State names available for /api/stats/state/{state}."""
+    return _respond(request, ("states",), lambda v: {
+        "states": sorted(s["state"] for s in _views(v)["summaries"].values())
+    })
+
+
+@router.get("/trend")
+def trend(request: Request, state: Optional[str] = Query(None)):
+    """Groundwater status distribution by year, nationally or for one state."""
+    key = state.strip().lower() if state else None
+
+    def build(version: str):
+        by_year = _views(version)["trends"].get(key)
+        if by_year is None:
+            raise HTTPException(status_code=404, detail=f"unknown state '{state}'")
+        return {
+            "state": _views(version)["summaries"][key]["state"] if key else None,
+            "years": [
+                {"year": year, "total": sum(counts.values()), "counts": counts}
+                for year, counts in sorted(by_year.items())
+            ],
+        }
+
+    return _respond(request, ("trend", key), build)
+
+
+@router.get("/top")
+def top(
+    request: Request,
+    metric: Metric = Query("groundwater_used_total"),
+    n: int = Query(10, ge=1, le=MAX_TOP_N),
+    order: Literal["desc", "asc"] = Query("desc"),
+    state: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    status: Optional[str] = Query(None, description="e.g. safe, semi_critical, critical, over_exploited"),
+):
+    """Top-N places by a metric, optionally filtered by state, year and status."""
+    # One normalized value for the filter, the cache key and the body: "Bihar" = " bihar".
+    state_key = (state or "").strip().lower()
+    status_key = (status or "").strip().lower()
+
+    def build(version: str):
+        where, params = ["1 = 1"], {"n": n}
+        if state_key:
+            where.append("lower(state) = :state")
+            params["state"] = state_key
+        if year is not None:
+            where.append("year = :year")
+            params["year"] = year
+        if status_key:
+            # Stored values are not uniformly cased ("hilly area" / "Hilly Area").
+            where.append("lower(groundwater_status) = :status")
+            params["status"] = status_key
+        rows = _fetch(f"""
+            SELECT place, state, {METRICS[metric]} AS value
+            FROM assessments
+            WHERE {' AND '.join(where)}
+            GROUP BY place, state
+            HAVING value IS NOT NULL
+            ORDER BY value {order.upper()}
+            LIMIT :n
+        """, params)
+        summary = _views(version)["summaries"].get(state_key)
+        return {"metric": metric, "order": order,
+                "state": summary["state"] if summary else (state_key or None), "year": year,
+                "status": status_key or None, "results": rows}
+
+    return _respond(request, ("top", metric, n, order, state_key, year, status_key), build)
@@ -0,0 +1,106 @@
+"""End-to-end answer cache for /api/chat.
+
+Popular questions are answered once per data version: the final localized
+response, its SQL and the English intermediate are stored under the
+normalized question text, language and data version. A hit skips
+translation, routing, SQL and synthesis entirely.
+
+Entries are fresh for ``ANSWER_CACHE_TTL_S``; after that they are still
+served for up to ``ANSWER_CACHE_STALE_S`` while the caller refreshes them in
+the background (stale-while-revalidate). A new data version drops everything.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Set, Tuple
+
+import rag_pipeline
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_STALE_S = float(os.getenv("ANSWER_CACHE_STALE_S", "86400"))
+
+Key = Tuple[str, str, str]
+
+
+@dataclass
+class CachedAnswer:
+    response: str                   # final, in the user's language
+    sql_query: Optional[str]
+    english_query: str              # question after translation to English
+    stored: float = field(default_factory=time.monotonic)
+
+
+def normalize(text: str) -> str:
+    """Case, width, whitespace and trailing punctuation don't change the answer."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?.!।॥ ").strip()
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE,
+                 ttl_s: float = ANSWER_CACHE_TTL_S, stale_s: float = ANSWER_CACHE_STALE_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self._version: Optional[str] = None
+        self._entries: "OrderedDict[Key, CachedAnswer]" = OrderedDict()
+        self._refreshing: Set[Key] = set()
+        self._lock = threading.Lock()
+
+    def key(self, question: str, language: str) -> Key:
+        return normalize(question), language or "en", rag_pipeline.data_version()
+
+    def get(self, key: Key) -> Tuple[Optional[CachedAnswer], bool]:
+        """(entry, needs_refresh). needs_refresh is True for one caller per stale entry."""
+        if self.max_entries <= 0:
+            return None, False
+        with self._lock:
+            if key[2] != self._version:
+                self._entries.clear()
+                self._refreshing.clear()
+                self._version = key[2]
+                return None, False
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            age = time.monotonic() - entry.stored
+            if age > self.ttl_s + self.stale_s:
+                return None, False  # kept for peek() until evicted
+            self._entries.move_to_end(key)
+            if age <= self.ttl_s or key in self._refreshing:
+                return entry, False
+            self._refreshing.add(key)
+            return entry, True
+
+    def peek(self, key: Key) -> Optional[CachedAnswer]:
+        """Entry for ``key`` at any age — a fallback while the LLM is unavailable."""
+        with self._lock:
+            return self._entries.get(key) if key[2] == self._version else None
+
+    def put(self, key: Key, entry: CachedAnswer) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._refreshing.discard(key)
+            if self._version is None:
+                self._version = key[2]
+            if key[2] != self._version:
+                return  # data changed while the answer was computed
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh_failed(self, key: Key) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
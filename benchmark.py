@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+Offline load-testing benchmark for the Aquamitra chat pipeline.
+
+Runs the FastAPI app in-process (no uvicorn, no network) with local stand-ins
+for Groq, Gemini and the embedding model, each with configurable injected
+latency. Replays the TEST_CATEGORIES questions from comprehensive_test.py at a
+configurable concurrency and reports throughput, p50/p95/p99 per stage and
+memory. Results are written as JSON tagged with the git commit so runs can be
+compared across commits:
+
+    python benchmark.py --concurrency 8 --rounds 3
+    python benchmark.py --compare bench_results/<old-commit>.json
+
+Slow and failing calls can be injected to exercise hedging, circuit breakers
+and degraded answers:
+
+    python benchmark.py --slow-rate 0.05 --slow-ms 3000 --groq-error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from comprehensive_test import TEST_CATEGORIES
+
+
+# --------------------------------------------------------------------------
+# STAGE RECORDER
+# --------------------------------------------------------------------------
+class StageRecorder:
+    """Collects wall-clock durations (ms) per named pipeline stage."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, stage: str, ms: float) -> None:
+        self.samples[stage].append(ms)
+
+    def reset(self) -> None:
+        self.samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+RECORDER = StageRecorder()
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile over already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50": round(percentile(ordered, 50), 3),
+        "p95": round(percentile(ordered, 95), 3),
+        "p99": round(percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def timed(stage: str, fn):
+    """Wrap a sync or async callable so each call is recorded under ``stage``."""
+    if asyncio.iscoroutinefunction(fn):
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                RECORDER.add(stage, (time.perf_counter() - start) * 1000)
+        return async_wrapper
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            RECORDER.add(stage, (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+class Latency:
+    """Injected latency: a base delay in ms plus uniform jitter.
+
+    Optionally a fraction of calls is slow (``slow_rate``, extra ``slow_ms``)
+    or fails (``error_rate``), to exercise hedging and circuit breakers.
+    """
+
+    def __init__(self, ms: float, jitter: float = 0.0, seed: int = 0,
+                 slow_rate: float = 0.0, slow_ms: float = 0.0, error_rate: float = 0.0):
+        self.ms = ms
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def seconds(self) -> float:
+        delay = self.ms + self._rng.uniform(-self.jitter, self.jitter) if self.jitter else self.ms
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            delay += self.slow_ms
+        return max(0.0, delay) / 1000.0
+
+    def maybe_fail(self, provider: str) -> None:
+        if self.error_rate and self._rng.random() < self.error_rate:
+            RECORDER.add(f"{provider}_injected_error", 0.0)
+            raise RuntimeError(f"injected {provider} error")
+
+
+# --------------------------------------------------------------------------
+# LOCAL STAND-INS
+# --------------------------------------------------------------------------
+STATUS_WORDS = {
+    "over-exploited": "over_exploited",
+    "over exploited": "over_exploited",
+    "semi-critical": "semi_critical",
+    "semi critical": "semi_critical",
+    "critical": "critical",
+    "sustainably": "safe",
+    "safe": "safe",
+}
+
+
+def fake_text_to_sql(question: str, states: Sequence[str]) -> str:
+    """Deterministic rule-based NL→SQL good enough to exercise DuckDB."""
+    q = question.lower()
+    where = []
+    for state in states:
+        if state.lower() in q:
+            where.append(f"state = '{state}'")
+            break
+    for word, status in STATUS_WORDS.items():
+        if word in q:
+            where.append(f"groundwater_status = '{status}'")
+            break
+    year = re.search(r"\b(20\d\d)\b", q)
+    if year:
+        where.append(f"year = {year.group(1)}")
+    above = re.search(r"above (\d+)", q)
+    if above:
+        column = "rainfall" if "rain" in q else "groundwater_used_total"
+        where.append(f"{column} > {above.group(1)}")
+    if "more groundwater than" in q:
+        where.append("groundwater_used_total > groundwater_refilled_total")
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+    limit = re.search(r"(?:top|bottom) (\d+)", q)
+    if "each state" in q or "for each state" in q:
+        agg = "AVG(rainfall)" if "rainfall" in q else "COUNT(*)"
+        return f"SELECT state, {agg} AS value FROM assessments{clause} GROUP BY state ORDER BY value DESC"
+    if "each year" in q:
+        return f"SELECT year, COUNT(*) AS value FROM assessments{clause} GROUP BY year ORDER BY year"
+    if "by groundwater status" in q:
+        return "SELECT groundwater_status, COUNT(*) FROM assessments GROUP BY groundwater_status"
+    if "percentage" in q:
+        return f"SELECT SUM(land_irrigated) * 100.0 / SUM(land_total) AS pct FROM assessments{clause}"
+    if "average" in q:
+        return f"SELECT AVG(rainfall) AS avg_rainfall FROM assessments{clause}"
+    if "total" in q and "used" in q:
+        return f"SELECT SUM(groundwater_used_total) FROM assessments{clause}"
+    if q.startswith("how many") or "count" in q:
+        return f"SELECT COUNT(*) FROM assessments{clause}"
+    if "highest" in q or "lowest" in q or limit:
+        column = "rainfall" if "rainfall" in q else "groundwater_used_total"
+        order = "ASC" if ("lowest" in q or "bottom" in q) else "DESC"
+        n = limit.group(1) if limit else "1"
+        return f"SELECT place, state, {column} FROM assessments{clause} ORDER BY {column} {order} LIMIT {n}"
+    return f"SELECT place, state, groundwater_status FROM assessments{clause} LIMIT 50"
+
+
+def classify_prompt(prompt: str) -> str:
+    if "Some choices are given below" in prompt:
+        return "llm_selector"
+    if "DATABASE SCHEMA" in prompt and "SQL Query:" in prompt:
+        return "llm_text_to_sql"
+    if "refining the answer to a previous question" in prompt:
+        return "llm_refine"
+    if "synthesize a response from the query results" in prompt:
+        return "llm_synthesis"
+    return "llm_glossary"
+
+
+def build_fake_llm(latency: Latency, states: Sequence[str]):
+    """A Groq stand-in implementing the llama_index CustomLLM interface."""
+    from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+    from llama_index.core.llms.callbacks import llm_completion_callback
+
+    def respond(prompt: str) -> str:
+        kind = classify_prompt(prompt)
+        if kind == "llm_selector":
+            question = prompt.rsplit("question: '", 1)[-1].rstrip("'\n ").lower()
+            glossary = any(w in question for w in ("mean", "definition", "define", "what does", "terminology"))
+            return json.dumps([{"choice": 2 if glossary else 1, "reason": "benchmark stand-in"}])
+        if kind == "llm_text_to_sql":
+            question = prompt.rsplit("Question:", 1)[-1].rsplit("SQL Query:", 1)[0]
+            return fake_text_to_sql(question.split("\n-- ")[0].strip(), states)
+        if kind == "llm_refine":
+            return "REGENERATE"
+        if kind == "llm_synthesis":
+            result = prompt.split("SQL Response:", 1)[-1].split("Response:", 1)[0].strip()
+            return f"Based on the assessment data: {result[:300]}"
+        return "Groundwater categories are safe, semi_critical, critical and over_exploited."
+
+    class FakeGroq(CustomLLM):
+        @property
+        def metadata(self) -> LLMMetadata:
+            return LLMMetadata(model_name="fake-groq", context_window=32768, num_output=512)
+
+        @llm_completion_callback()
+        def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+            start = time.perf_counter()
+            time.sleep(latency.seconds())
+            latency.maybe_fail("groq")
+            text = respond(prompt)
+            RECORDER.add(classify_prompt(prompt), (time.perf_counter() - start) * 1000)
+            return CompletionResponse(text=text)
+
+        @llm_completion_callback()
+        async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+            start = time.perf_counter()
+            await asyncio.sleep(latency.seconds())
+            latency.maybe_fail("groq")
+            text = respond(prompt)
+            RECORDER.add(classify_prompt(prompt), (time.perf_counter() - start) * 1000)
+            return CompletionResponse(text=text)
+
+        @llm_completion_callback()
+        def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+            response = self.complete(prompt, formatted=formatted, **kwargs)
+            yield CompletionResponse(text=response.text, delta=response.text)
+
+    return FakeGroq()
+
+
+def build_fake_embedding(latency: Latency, dim: int = 384):
+    """An embedding stand-in returning deterministic hash-based vectors."""
+    from llama_index.core.embeddings import BaseEmbedding
+
+    def vector(text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        rng = random.Random(digest)
+        return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+    class FakeEmbedding(BaseEmbedding):
+        def _embed(self, text: str) -> List[float]:
+            start = time.perf_counter()
+            time.sleep(latency.seconds())
+            out = vector(text)
+            RECORDER.add("embed", (time.perf_counter() - start) * 1000)
+            return out
+
+        async def _aembed(self, text: str) -> List[float]:
+            start = time.perf_counter()
+            await asyncio.sleep(latency.seconds())
+            out = vector(text)
+            RECORDER.add("embed", (time.perf_counter() - start) * 1000)
+            return out
+
+        def _get_query_embedding(self, query: str) -> List[float]:
+            return self._embed(query)
+
+        async def _aget_query_embedding(self, query: str) -> List[float]:
+            return await self._aembed(query)
+
+        def _get_text_embedding(self, text: str) -> List[float]:
+            return self._embed(text)
+
+    return FakeEmbedding(model_name="fake-embedding")
+
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGemini:
+    """Gemini stand-in: echoes the text to translate after a blocking delay."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def generate_content(self, prompt: str) -> FakeGeminiResponse:
+        time.sleep(self.latency.seconds())
+        self.latency.maybe_fail("gemini")
+        if "Language code:" in prompt:
+            return FakeGeminiResponse("en")
+        body = prompt.rsplit("text:", 1)[-1]
+        return FakeGeminiResponse(body.rsplit("\n\n", 1)[0].strip())
+
+
+# --------------------------------------------------------------------------
+# WIRING
+# --------------------------------------------------------------------------
+def install_stand_ins(args, workdir: Path):
+    """Point rag_pipeline/translation_service at local backends and a scratch DB."""
+    from sqlalchemy import create_engine, text
+    from llama_index.core import Settings, SQLDatabase
+
+    import rag_pipeline
+    import server
+    import translation_service
+
+    engine = create_engine(f"duckdb:///{workdir / 'bench.duckdb'}")
+    rag_pipeline._ensure_tables(engine)
+    rag_pipeline._ensure_chat_logs(engine)
+    with engine.begin() as conn:
+        states = [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT state FROM assessments WHERE state IS NOT NULL"
+        )).fetchall()]
+
+    import resilience
+    import resilient_llm
+
+    groq_latency = Latency(args.groq_ms, args.jitter_ms, seed=1, slow_rate=args.slow_rate,
+                           slow_ms=args.slow_ms, error_rate=args.groq_error_rate)
+    # Wrapped like the real Groq model in rag_pipeline._make_llm / _init_models.
+    fake_groq = resilient_llm.wrap(build_fake_llm(groq_latency, states), resilience.GROQ)
+    rag_pipeline._llms = {stage: resilient_llm.meter(fake_groq, stage) for stage in rag_pipeline.LLM_STAGES}
+    Settings.llm = rag_pipeline._llms["synthesis"]
+    Settings.embed_model = build_fake_embedding(Latency(args.embed_ms, 0.0, seed=2))
+    rag_pipeline._engine = engine
+    rag_pipeline._router = None
+    rag_pipeline._INITIALIZED = True
+
+    gemini_latency = Latency(args.gemini_ms, args.jitter_ms, seed=3, slow_rate=args.slow_rate,
+                             slow_ms=args.slow_ms, error_rate=args.gemini_error_rate)
+    service = translation_service.TranslationService(model=FakeGemini(gemini_latency))
+    service.min_request_interval = args.gemini_min_interval
+    translation_service.set_translation_service(service)
+
+    # Server-level stages. server.py imported the helpers by name, so wrap there.
+    server.translate_query_to_english = timed("translate_in", translation_service.translate_query_to_english)
+    server.translate_response_to_language = timed("translate_out", translation_service.translate_response_to_language)
+    rag_pipeline.aquery = timed("rag", rag_pipeline.aquery)
+    SQLDatabase.run_sql = timed("sql_exec", SQLDatabase.run_sql)
+
+    # Replayed rounds would otherwise be answered from the end-to-end cache.
+    if not args.answer_cache:
+        server._answer_cache.max_entries = 0
+    return server.app
+
+
+def build_workload(languages: Sequence[str], rounds: int, limit: Optional[int]) -> List[Dict[str, str]]:
+    questions = [q for qs in TEST_CATEGORIES.values() for q in qs]
+    if limit:
+        questions = questions[:limit]
+    return [
+        {"question": q, "language": lang}
+        for _ in range(rounds)
+        for lang in languages
+        for q in questions
+    ]
+
+
+async def run_load(app, workload: List[Dict[str, str]], concurrency: int, timeout: float) -> Dict[str, Any]:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    errors: Dict[str, int] = defaultdict(int)
+    ok = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+        async def one(i: int, item: Dict[str, str]):
+            nonlocal ok
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/api/chat", json={
+                        "messages": [{"role": "user", "content": item["question"]}],
+                        "language": item["language"],
+                        "session_id": f"bench-{i % concurrency}",
+                    })
+                    if r.status_code == 200:
+                        ok += 1
+                        body = r.json()
+                        RECORDER.add("server_latency", float(body.get("latency_ms", 0)))
+                        if body.get("degraded"):
+                            errors["degraded_200"] += 1
+                    else:
+                        errors[f"http_{r.status_code}"] += 1
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                finally:
+                    RECORDER.add("end_to_end", (time.perf_counter() - start) * 1000)
+
+        # Warm the router once so build cost is reported separately.
+        start = time.perf_counter()
+        import rag_pipeline
+        await rag_pipeline.get_router()
+        RECORDER.add("router_build", (time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i, item) for i, item in enumerate(workload)))
+        wall = time.perf_counter() - start
+
+    return {
+        "requests": len(workload),
+        "ok": ok,
+        "errors": dict(errors),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(workload) / wall, 3) if wall else 0.0,
+    }
+
+
+def memory_snapshot() -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        out["python_heap_mb"] = round(current / 2**20, 2)
+        out["python_heap_peak_mb"] = round(peak / 2**20, 2)
+    if resource is not None:
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes on Linux.
+        out["max_rss_mb"] = round(rss_kb / (2**20 if sys.platform == "darwin" else 2**10), 2)
+    return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\n📊 Compared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    before, after = baseline["run"]["throughput_rps"], current["run"]["throughput_rps"]
+    print(f"   throughput: {before} → {after} rps")
+    for stage, stats in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old:
+            print(f"   {stage:<16} new")
+            continue
+        deltas = []
+        for key in ("p50", "p95", "p99"):
+            delta = stats[key] - old[key]
+            pct = (delta / old[key] * 100) if old[key] else 0.0
+            deltas.append(f"{key} {old[key]:.1f}→{stats[key]:.1f} ({pct:+.0f}%)")
+        print(f"   {stage:<16} " + "  ".join(deltas))
+    for stage, u in current.get("llm_usage", {}).items():
+        old = baseline.get("llm_usage", {}).get(stage)
+        if old:
+            before = old["prompt_tokens"] + old["completion_tokens"]
+            after = u["prompt_tokens"] + u["completion_tokens"]
+            print(f"   {stage:<16} tokens {before} → {after}  calls {old['calls']} → {u['calls']}")
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    run = result["run"]
+    print("=" * 80)
+    print(f"BENCHMARK  commit={result['commit']}  concurrency={result['config']['concurrency']}")
+    print("=" * 80)
+    print(f"Requests: {run['requests']}  OK: {run['ok']}  Errors: {run['errors'] or 'none'}")
+    print(f"Wall: {run['wall_s']}s  Throughput: {run['throughput_rps']} req/s")
+    print(f"\n{'stage':<16}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<16}{s['count']:>7}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}")
+    print(f"\nMemory: {result['memory']}")
+    for name, p in result.get("providers", {}).items():
+        print(f"Provider {name}: {p}")
+    for name, q in result.get("queues", {}).items():
+        print(f"Queue {name}: {q}")
+    if result.get("speculation"):
+        print(f"Speculation: {result['speculation']}")
+    if result.get("sql_templates"):
+        print(f"SQL templates: {result['sql_templates']}")
+    llm_usage = result.get("llm_usage", {})
+    if llm_usage:
+        requests = max(1, result["run"]["requests"])
+        print(f"\n{'llm stage':<16}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}{'tok/request':>13}")
+        for stage, u in llm_usage.items():
+            per_request = (u["prompt_tokens"] + u["completion_tokens"]) / requests
+            print(f"{stage:<16}{u['calls']:>7}{u['prompt_tokens']:>12}{u['completion_tokens']:>11}{per_request:>13.1f}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--rounds", type=int, default=1, help="times to replay the question set")
+    p.add_argument("--limit", type=int, default=None, help="only use the first N questions")
+    p.add_argument("--languages", default="en", help="comma-separated language codes, e.g. en,hi")
+    p.add_argument("--groq-ms", type=float, default=300.0, help="injected latency per LLM call")
+    p.add_argument("--gemini-ms", type=float, default=200.0, help="injected latency per translation call")
+    p.add_argument("--embed-ms", type=float, default=5.0, help="injected latency per embedding")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="uniform ± jitter on LLM/translation latency")
+    p.add_argument("--gemini-min-interval", type=float, default=1.0,
+                   help="TranslationService rate-limit interval (seconds)")
+    p.add_argument("--slow-rate", type=float, default=0.0,
+                   help="fraction of LLM/translation calls that get --slow-ms extra latency")
+    p.add_argument("--slow-ms", type=float, default=0.0)
+    p.add_argument("--groq-error-rate", type=float, default=0.0, help="fraction of LLM calls that fail")
+    p.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of translation calls that fail")
+    p.add_argument("--answer-cache", action="store_true",
+                   help="keep the end-to-end answer cache on (repeated rounds become cache hits)")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--no-tracemalloc", action="store_true", help="skip Python heap tracing (lower overhead)")
+    p.add_argument("--out", default=None, help="result JSON path (default bench_results/<commit>.json)")
+    p.add_argument("--compare", default=None, help="baseline result JSON to diff against")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory(prefix="aquamitra-bench-") as tmp:
+        app = install_stand_ins(args, Path(tmp))
+        workload = build_workload([l.strip() for l in args.languages.split(",") if l.strip()], args.rounds, args.limit)
+        run = asyncio.run(run_load(app, workload, args.concurrency, args.timeout))
+
+    import resilience
+    import scheduler
+    import speculative_router
+    import sql_templates
+    import usage
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "run": run,
+        "stages": RECORDER.summary(),
+        "memory": memory_snapshot(),
+        "providers": resilience.status(),
+        "queues": scheduler.status(),
+        "llm_usage": usage.totals(),
+        "speculation": speculative_router.status(),
+        "sql_templates": sql_templates.status(),
+    }
+    print_report(result)
+
+    out = Path(args.out or f"bench_results/{commit}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"\nResults saved to {out}")
+
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Embedding backend benchmark: PyTorch (HuggingFace) vs int8 ONNX.
+
+Each backend runs in its own subprocess so import time and memory are
+measured from a clean interpreter. Reported per backend:
+
+- import_s / load_s: module import, then model load + first embedding
+- rss_mb: peak resident memory after the run
+- seq_qps: single query embeddings one after another
+- concurrent_qps: the same queries issued concurrently (micro-batched for ONNX)
+
+    python benchmark_embeddings.py --onnx-dir models/bge-small-onnx-int8
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from comprehensive_test import TEST_CATEGORIES
+
+QUESTIONS = [q for qs in TEST_CATEGORIES.values() for q in qs]
+
+
+def _rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def run_child(backend: str, onnx_dir: str, n: int) -> dict:
+    """Measure one backend in this process (invoked via --child)."""
+    start = time.perf_counter()
+    import rag_pipeline
+    spec = f"onnx:{onnx_dir}" if backend == "onnx" else "huggingface"
+    model = rag_pipeline._make_embed_model(spec)
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.get_query_embedding("warm up")
+    load_s = time.perf_counter() - start
+
+    queries = [QUESTIONS[i % len(QUESTIONS)] + f" #{i}" for i in range(n)]
+
+    start = time.perf_counter()
+    for q in queries:
+        model.get_query_embedding(q)
+    seq_s = time.perf_counter() - start
+
+    async def concurrent():
+        await asyncio.gather(*(model.aget_query_embedding(q) for q in queries))
+
+    start = time.perf_counter()
+    asyncio.run(concurrent())
+    conc_s = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "import_s": round(import_s, 3),
+        "load_s": round(load_s, 3),
+        "seq_qps": round(n / seq_s, 1),
+        "concurrent_qps": round(n / conc_s, 1),
+        "rss_mb": _rss_mb(),
+        "dim": len(model.get_query_embedding("dim")),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--backends", default="huggingface,onnx")
+    p.add_argument("--onnx-dir", default="models/bge-small-onnx-int8")
+    p.add_argument("-n", type=int, default=256, help="queries per throughput test")
+    p.add_argument("--out", default="bench_results/embeddings.json")
+    p.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.onnx_dir, args.n)))
+        return
+
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        print(f"⏱ {backend}...")
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--onnx-dir", args.onnx_dir, "-n", str(args.n)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"❌ {backend} failed:\n{proc.stderr.strip()[-2000:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print("=" * 80)
+    print(f"{'backend':<14}{'import s':>10}{'load s':>10}{'seq q/s':>10}{'conc q/s':>10}{'RSS MB':>10}")
+    for r in results:
+        print(f"{r['backend']:<14}{r['import_s']:>10}{r['load_s']:>10}{r['seq_qps']:>10}"
+              f"{r['concurrent_qps']:>10}{r['rss_mb']:>10}")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"\nResults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
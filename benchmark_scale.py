@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Data-scaling benchmark: ingestion and query latency at N× the INGRES data.
+
+For each scale, synthetic data is generated with scale_ingres.py and loaded
+through the real pipeline (rag_pipeline._ensure_tables: CSV → assessments,
+place_metrics, index, swap) into a fresh DuckDB file. Reported per scale:
+
+- generate_s / ingest_s: data generation, then the pipeline load
+- db_mb: DuckDB file size after a checkpoint
+- queries: p50 / max latency and result rows of every example query in the
+  text-to-SQL prompt (rag_pipeline.SQL_EXAMPLES), i.e. the shapes the LLM
+  is taught to write
+- distribution: status shares, state count and rainfall/usage medians
+  against the real data, to check the synthetic data stays similar
+- add_state: with --add-state, the per-name cost of
+  add_state_column.get_state_for_place over the scaled place names
+
+    python benchmark_scale.py                      # 1×, 10×, 100×
+    python benchmark_scale.py --scales 1000 --repeat 3 --workdir /data/scale
+"""
+
+import argparse
+import json
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine, text
+
+import rag_pipeline
+import scale_ingres
+from benchmark import git_commit
+
+
+def example_queries() -> List[Tuple[str, str]]:
+    """(question, sql) pairs from the text-to-SQL prompt's examples."""
+    pairs = re.findall(r"Q: (.+?)\nA: (.+?)(?=\n\nQ: |\Z)", rag_pipeline.SQL_EXAMPLES, re.S)
+    return [(q.strip(), " ".join(sql.split()).rstrip(";")) for q, sql in pairs]
+
+
+def distribution(engine) -> Dict[str, Any]:
+    with engine.connect() as conn:
+        shares = dict(conn.execute(text("""
+            SELECT groundwater_status, round(COUNT(*) * 1.0 / SUM(COUNT(*)) OVER (), 4)
+            FROM assessments GROUP BY groundwater_status
+        """)).fetchall())
+        states, rain, used, extraction = conn.execute(text("""
+            SELECT COUNT(DISTINCT state), median(rainfall), median(groundwater_used_total),
+                   median(groundwater_used_total * 100.0 / NULLIF(groundwater_refilled_total, 0))
+            FROM assessments
+        """)).fetchone()
+    return {
+        "status_shares": {str(k): float(v) for k, v in sorted(shares.items(), key=lambda kv: str(kv[0]))},
+        "states": states,
+        "median_rainfall": round(rain, 1),
+        "median_used": round(used, 1),
+        "median_extraction_pct": round(extraction, 1),
+    }
+
+
+def time_queries(engine, repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    with engine.connect() as conn:
+        for question, sql in example_queries():
+            timings, rows = [], 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = len(conn.execute(text(sql)).fetchall())
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append({
+                "question": question,
+                "p50_ms": round(statistics.median(timings), 2),
+                "max_ms": round(max(timings), 2),
+                "rows": rows,
+            })
+    return results
+
+
+def time_add_state(engine, limit: int) -> Dict[str, Any]:
+    from add_state_column import get_state_for_place
+
+    with engine.connect() as conn:
+        places = [r[0] for r in conn.execute(text(
+            f"SELECT DISTINCT place FROM assessments WHERE place IS NOT NULL ORDER BY hash(place) LIMIT {int(limit)}"
+        )).fetchall()]
+    start = time.perf_counter()
+    unknown = sum(get_state_for_place(p) == "Unknown" for p in places)
+    seconds = time.perf_counter() - start
+    return {
+        "places": len(places),
+        "seconds": round(seconds, 2),
+        "us_per_place": round(seconds * 1e6 / max(1, len(places)), 1),
+        "unknown": unknown,
+    }
+
+
+def run_scale(scale: int, workdir: Path, repeat: int, add_state: int) -> Dict[str, Any]:
+    data_dir = workdir / f"ingres_x{scale}"
+    db_file = workdir / f"ingres_x{scale}.duckdb"
+    db_file.unlink(missing_ok=True)
+
+    generated = scale_ingres.generate(scale, data_dir)
+
+    rag_pipeline.DATA_DIR = data_dir
+    engine = create_engine(f"duckdb:///{db_file}")
+    start = time.perf_counter()
+    rag_pipeline._ensure_tables(engine)
+    ingest_s = time.perf_counter() - start
+    with engine.begin() as conn:
+        conn.execute(text("CHECKPOINT"))
+
+    result = {
+        "scale": scale,
+        "rows": generated["rows"],
+        "csv_mb": round(generated["bytes"] / 2**20, 1),
+        "generate_s": generated["seconds"],
+        "ingest_s": round(ingest_s, 2),
+        "db_mb": round(db_file.stat().st_size / 2**20, 1),
+        "queries": time_queries(engine, repeat),
+        "distribution": distribution(engine),
+    }
+    if add_state:
+        result["add_state"] = time_add_state(engine, add_state)
+    engine.dispose()
+    return result
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print("=" * 80)
+    print(f"{'scale':>6}{'rows':>12}{'csv MB':>9}{'gen s':>8}{'ingest s':>10}{'db MB':>8}{'Σ query p50 ms':>16}")
+    for r in results:
+        total = sum(q["p50_ms"] for q in r["queries"])
+        print(f"{r['scale']:>5}×{r['rows']:>12}{r['csv_mb']:>9}{r['generate_s']:>8}{r['ingest_s']:>10}"
+              f"{r['db_mb']:>8}{total:>16.1f}")
+
+    print(f"\n{'query (p50 ms per scale)':<60}" + "".join(f"{str(r['scale']) + '×':>10}" for r in results))
+    for i, (question, _) in enumerate(example_queries()):
+        print(f"{question[:58]:<60}" + "".join(f"{r['queries'][i]['p50_ms']:>10.1f}" for r in results))
+
+    print("\nDistribution:")
+    for r in results:
+        print(f"  {r['scale']:>5}× {r['distribution']}")
+    for r in results:
+        if "add_state" in r:
+            print(f"  {r['scale']:>5}× add_state_column lookup: {r['add_state']}")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scales", default="1,10,100", help="comma-separated multiples, e.g. 1,10,100,1000")
+    p.add_argument("--repeat", type=int, default=5, help="runs per query (p50/max)")
+    p.add_argument("--workdir", default=None, help="keep generated data and DBs here (default: temp dir)")
+    p.add_argument("--add-state", type=int, default=0, metavar="N",
+                   help="also time add_state_column lookups for up to N scaled place names")
+    p.add_argument("--out", default=None, help="result JSON path (default bench_results/scale_<commit>.json)")
+    args = p.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    with tempfile.TemporaryDirectory(prefix="aquamitra-scale-") as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        results = []
+        for scale in scales:
+            print(f"\n📈 Scale {scale}×")
+            results.append(run_scale(scale, workdir, args.repeat, args.add_state))
+
+    print_report(results)
+    commit = git_commit()
+    out = Path(args.out or f"bench_results/scale_{commit}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "results": results,
+    }, indent=2))
+    print(f"\nResults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
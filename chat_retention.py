@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Chat log retention: archive idle sessions to Parquet and compact chat_logs.
+
+Sessions whose latest message is older than the retention window are copied to
+a ZSTD-compressed Parquet file and deleted from the live table. The remaining
+rows are then rewritten in (session_id, created_at, id) order so DuckDB's
+per-row-group min/max statistics prune history lookups to a handful of row
+groups.
+
+Compaction alone also runs on a schedule by default: the server calls
+``compact_if_grown`` every CHAT_COMPACT_INTERVAL_S and rewrites the table once
+CHAT_COMPACT_MIN_NEW_ROWS rows were appended (unsorted) since the last time.
+
+Run it from cron while the server is stopped, or let the server run it
+periodically by setting CHAT_RETENTION_DAYS:
+
+    python chat_retention.py --days 90 --archive-dir data/chat_archive
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+import rag_pipeline
+from rag_pipeline import CHAT_LOGS_COLUMNS, CHAT_LOGS_DDL
+
+DEFAULT_ARCHIVE_DIR = "data/chat_archive"
+
+# Highest chat_logs id covered by the last compaction in this process.
+_compacted_through: Optional[int] = None
+
+
+def archive_old_sessions(engine, days: int, archive_dir: str = DEFAULT_ARCHIVE_DIR) -> Dict[str, object]:
+    """Move sessions idle for more than ``days`` days to Parquet, then compact."""
+    archive_path = Path(archive_dir)
+    archive_path.mkdir(parents=True, exist_ok=True)
+    out_file = archive_path / f"chat_logs_{time.strftime('%Y%m%dT%H%M%S')}.parquet"
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TEMP TABLE expired_sessions AS
+            SELECT session_id
+            FROM chat_logs
+            GROUP BY session_id
+            HAVING MAX(created_at) < current_timestamp::TIMESTAMP - INTERVAL {int(days)} DAY
+        """))
+        sessions = conn.execute(text("SELECT COUNT(*) FROM expired_sessions")).scalar()
+        archived = 0
+
+        if sessions:
+            archived = conn.execute(text("""
+                SELECT COUNT(*) FROM chat_logs
+                WHERE session_id IN (SELECT session_id FROM expired_sessions)
+            """)).scalar()
+            conn.execute(text(f"""
+                COPY (
+                    SELECT {CHAT_LOGS_COLUMNS} FROM chat_logs
+                    WHERE session_id IN (SELECT session_id FROM expired_sessions)
+                    ORDER BY session_id, created_at, id
+                ) TO '{out_file.as_posix()}' (FORMAT PARQUET, COMPRESSION ZSTD)
+            """))
+            conn.execute(text("""
+                DELETE FROM chat_logs
+                WHERE session_id IN (SELECT session_id FROM expired_sessions)
+            """))
+        conn.execute(text("DROP TABLE expired_sessions"))
+
+    remaining = compact_chat_logs(engine)
+
+    return {
+        "sessions_archived": sessions,
+        "rows_archived": archived,
+        "rows_remaining": remaining,
+        "archive_file": str(out_file) if sessions else None,
+    }
+
+
+def compact_chat_logs(engine) -> int:
+    """Rewrite chat_logs sorted by session and time; swap in one transaction."""
+    global _compacted_through
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS chat_logs_compact"))
+        conn.execute(text(CHAT_LOGS_DDL.format(name="chat_logs_compact")))
+        conn.execute(text(f"""
+            INSERT INTO chat_logs_compact ({CHAT_LOGS_COLUMNS})
+            SELECT {CHAT_LOGS_COLUMNS} FROM chat_logs
+            ORDER BY session_id, created_at, id
+        """))
+        conn.execute(text("DROP TABLE chat_logs"))
+        conn.execute(text("ALTER TABLE chat_logs_compact RENAME TO chat_logs"))
+        remaining, through = conn.execute(text("SELECT COUNT(*), MAX(id) FROM chat_logs")).fetchone()
+    _compacted_through = through
+
+    # Reclaim the space freed by the deleted and rewritten blocks.
+    with engine.begin() as conn:
+        conn.execute(text("CHECKPOINT"))
+    return remaining
+
+
+def compact_if_grown(engine, min_new_rows: int) -> Optional[int]:
+    """Compact once ``min_new_rows`` rows arrived since the last compaction; rows left or None."""
+    with engine.connect() as conn:
+        new_rows = conn.execute(
+            text("SELECT COUNT(*) FROM chat_logs WHERE id > :after"),
+            {"after": -1 if _compacted_through is None else _compacted_through},
+        ).scalar()
+    if new_rows < min_new_rows:
+        return None
+    return compact_chat_logs(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and compact chat_logs")
+    parser.add_argument("--days", type=int, default=90, help="archive sessions idle longer than this")
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("CHAT LOG RETENTION")
+    print("=" * 80)
+    result = archive_old_sessions(rag_pipeline.get_engine(), args.days, args.archive_dir)
+    print(f"✅ Archived {result['rows_archived']} rows from {result['sessions_archived']} sessions")
+    if result["archive_file"]:
+        print(f"   Archive: {result['archive_file']}")
+    print(f"   Live rows: {result['rows_remaining']}")
+
+
+if __name__ == "__main__":
+    main()
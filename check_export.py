@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Regression check for the /api/export SQL validator (export.validate).
+
+Export runs caller-supplied SQL, so the validator must only let through a
+single read-only SELECT over assessments / place_metrics. Every case below is
+validated with DuckDB's parser (no data needed), and the row limit is checked
+against a small in-memory table; the check exits with code 1 if a rejected
+case is accepted or an accepted one is rejected.
+
+    python check_export.py
+"""
+
+import sys
+
+import duckdb
+from fastapi import HTTPException
+
+import export
+
+ACCEPTED = [
+    "SELECT * FROM assessments",
+    "SELECT place, extraction_pct FROM place_metrics WHERE year = 2023 ORDER BY 2 DESC LIMIT 10;",
+    "WITH s AS (SELECT state, AVG(rainfall) AS r FROM assessments GROUP BY state) SELECT * FROM s",
+    "SELECT * FROM assessments WHERE place = 'Load'",
+]
+
+REJECTED = [
+    # other tables
+    "SELECT * FROM chat_logs",
+    "SELECT * FROM main.chat_logs",
+    "SELECT * FROM assessments WHERE place IN (SELECT content FROM chat_logs)",
+    "SELECT place FROM assessments UNION ALL SELECT content FROM chat_logs",
+    "WITH assessments AS (SELECT * FROM chat_logs) SELECT * FROM assessments",
+    "SELECT * FROM assessments_staging",
+    # catalog
+    "SELECT * FROM information_schema.tables",
+    "SELECT * FROM duckdb_tables()",
+    "SELECT * FROM pg_catalog.pg_tables",
+    # files
+    "SELECT * FROM read_csv('data/ingres/groundwater_2023.csv')",
+    "SELECT * FROM read_csv_auto('/etc/passwd')",
+    "SELECT * FROM 'data/ingres/groundwater_2023.csv'",
+    "SELECT * FROM '/etc/passwd'",
+    "SELECT * FROM read_parquet('s3://bucket/x.parquet')",
+    "SELECT * FROM assessments, read_text('/etc/hostname')",
+    # not a single read-only SELECT
+    "DELETE FROM assessments",
+    "SELECT 1; DROP TABLE assessments",
+    "COPY assessments TO '/tmp/out.csv'",
+    "ATTACH '/tmp/other.duckdb' AS other",
+    "PRAGMA database_list",
+]
+
+
+def _accepted(db, sql: str) -> bool:
+    try:
+        export.validate(db, sql)
+        return True
+    except HTTPException:
+        return False
+
+
+# Against 10 rows with EXPORT_MAX_ROWS = 100.
+SIZE_ACCEPTED = [
+    "SELECT * FROM assessments",
+    "SELECT * FROM assessments a, assessments b",
+    "SELECT count(*) FROM assessments a, assessments b, assessments c",
+    "SELECT * FROM assessments -- trailing comment",
+]
+SIZE_REJECTED = [
+    "SELECT * FROM assessments a, assessments b, assessments c",
+    "SELECT * FROM assessments a CROSS JOIN assessments b CROSS JOIN assessments c CROSS JOIN assessments d",
+]
+
+
+def _size_accepted(db, sql: str) -> bool:
+    try:
+        export.check_size(db, export.validate(db, sql))
+        return True
+    except HTTPException:
+        return False
+
+
+def _run(db, cases, accepted) -> int:
+    failures = 0
+    for sql, expected in cases:
+        if accepted(db, sql) == expected:
+            print(f"✅ {'accepted' if expected else 'rejected'}: {sql}")
+        else:
+            failures += 1
+            print(f"❌ {'rejected' if expected else 'accepted'} but should not be: {sql}")
+    return failures
+
+
+def main() -> int:
+    db = duckdb.connect()
+    failures = _run(db, [(s, True) for s in ACCEPTED] + [(s, False) for s in REJECTED], _accepted)
+
+    db.execute("CREATE TABLE assessments AS SELECT range AS id FROM range(10)")
+    export.EXPORT_MAX_ROWS = 100
+    failures += _run(db, [(s, True) for s in SIZE_ACCEPTED] + [(s, False) for s in SIZE_REJECTED], _size_accepted)
+    db.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
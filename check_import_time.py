@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the server and pipeline modules.
+
+Each module is imported in a fresh interpreter with ``python -X importtime``.
+The check fails (exit code 1) when a module takes longer than its budget or
+pulls in a heavy dependency that should only load on first use (LlamaIndex,
+Groq, PyTorch, Gemini, ...). The slowest imports are printed to show what
+to defer.
+
+    python check_import_time.py
+    python check_import_time.py --budget-ms 2000 --top 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = ["server", "rag_pipeline", "analytics", "export", "answer_cache", "resilience", "scheduler",
+           "usage", "prewarm", "profiler", "speculative_router", "sql_templates", "conversation", "entity_index",
+           "translation_service", "chat_retention"]
+
+# Loaded by the first question (router build / first translation), never at import.
+DEFERRED = ["llama_index", "torch", "transformers", "sentence_transformers",
+            "google.generativeai", "groq", "nest_asyncio", "onnxruntime", "llama_cpp"]
+
+DEFAULT_BUDGET_MS = int(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+
+def profile(module: str):
+    """(total ms, [(cumulative ms, name)], loaded deferred modules) for one import."""
+    code = (
+        "import sys, json\n"
+        f"import {module}\n"
+        f"print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {DEFERRED!r} "
+        f"or m in {DEFERRED!r})))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"❌ import {module} failed:\n{proc.stderr.strip()[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        rows.append((int(fields[1]) / 1000, fields[2].strip()))
+
+    total = next((ms for ms, name in rows if name == module), 0.0)
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return total, rows, loaded
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("modules", nargs="*", default=MODULES)
+    p.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS,
+                   help="maximum cumulative import time per module (default: %(default)s)")
+    p.add_argument("--top", type=int, default=10, help="slowest imports to list per module")
+    args = p.parse_args()
+
+    failed = False
+    for module in args.modules:
+        total, rows, loaded = profile(module)
+        ok = total <= args.budget_ms and not loaded
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {module}: {total:.0f} ms (budget {args.budget_ms} ms)")
+        if loaded:
+            roots = sorted({m.split(".")[0] if m.split(".")[0] in DEFERRED else m for m in loaded})
+            print(f"   loads deferred dependencies at import: {', '.join(roots)}")
+        if not ok:
+            for ms, name in sorted(rows, reverse=True)[:args.top]:
+                print(f"   {ms:>9.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Regression check for sql_templates: which generated SQL may become a template.
+
+Runs learn()/match() against the local ingres.duckdb (entity names come from
+the loaded data) and exits with code 1 if a template is registered for SQL
+that would answer a same-shaped question wrongly, or a safe one is refused.
+
+    python check_sql_templates.py
+"""
+
+import sys
+
+import sql_templates
+
+# (question, generated SQL, same-shaped question, SQL expected for it or None if refused)
+CASES = [
+    ("What is the average rainfall in Madhya Pradesh?",
+     "SELECT AVG(rainfall) FROM assessments WHERE state = 'Madhya Pradesh'",
+     "What is the average rainfall in Bihar?",
+     "SELECT AVG(rainfall) FROM assessments WHERE state = 'Bihar'"),
+    ("Which places in Rajasthan got worse in 2023?",
+     "SELECT place FROM place_metrics WHERE state = 'Rajasthan' AND year = 2023 AND status_change = 'worsened'",
+     "Which places in Gujarat got worse in 2022?",
+     "SELECT place FROM place_metrics WHERE state = 'Gujarat' AND year = 2022 AND status_change = 'worsened'"),
+    ("Show top 5 districts with highest groundwater usage",
+     "SELECT place, SUM(groundwater_used_total) AS total FROM assessments GROUP BY place ORDER BY total DESC LIMIT 5",
+     "Show top 12 districts with highest groundwater usage",
+     "SELECT place, SUM(groundwater_used_total) AS total FROM assessments GROUP BY place ORDER BY total DESC LIMIT 12"),
+    # A status the question didn't ask for would stay fixed.
+    ("Which districts in Bihar are critical?",
+     "SELECT place FROM assessments WHERE state = 'Bihar' AND groundwater_status IN ('critical', 'over_exploited')",
+     "Which districts in Rajasthan are safe?", None),
+    # A state the question didn't name would stay fixed.
+    ("Which districts are critical?",
+     "SELECT place FROM assessments WHERE state = 'Bihar' AND groundwater_status = 'critical'",
+     "Which districts are safe?", None),
+    # 100 is both the percentage scale and the threshold.
+    ("Show areas where usage is more than 100% of refill",
+     "SELECT place FROM assessments WHERE groundwater_used_total * 100.0 / groundwater_refilled_total > 100",
+     "Show areas where usage is more than 90% of refill", None),
+    # The year is not used by the SQL.
+    ("Average rainfall in Bihar in 2023",
+     "SELECT AVG(rainfall) FROM assessments WHERE state = 'Bihar'",
+     "Average rainfall in Bihar in 2021", None),
+]
+
+
+def main() -> int:
+    failures = 0
+    for question, sql, other, expected in CASES:
+        sql_templates.clear()
+        sql_templates.learn(question, sql)
+        hit = sql_templates.match(other)
+        got = sql_templates.render_sql(*hit) if hit else None
+        if got == expected:
+            print(f"✅ {other}")
+        else:
+            failures += 1
+            print(f"❌ {other}\n   expected: {expected}\n   got:      {got}")
+    sql_templates.clear()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""Conversation-aware refinement of the previous SQL answer.
+
+For each session we remember the last question, its SQL and a materialized
+copy of its result (a DuckDB temp table on one dedicated connection). A short
+follow-up such as "now just 2023" or "only the critical ones" is answered
+against that relation instead of re-running routing, full text-to-SQL and a
+scan of `assessments`:
+
+1. Rule path (no LLM for SQL): values of low-cardinality text columns and
+   years mentioned in the follow-up become filters on `prev` (NOT IN after
+   "except", "without", "not", ...). "top N" keeps the first N rows only when
+   the previous SQL was ordered and the follow-up names no sort key.
+2. Refine path: a compact prompt (previous SQL + `prev` columns) asks the SQL
+   model for a SELECT over `prev`, or REGENERATE. It must read only `prev`.
+3. Otherwise the caller runs the full pipeline with the previous question as
+   context.
+
+The SQL reported back is `WITH prev AS (<previous sql>) <refinement>`, which
+runs standalone against the database.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import rag_pipeline
+
+MAX_SESSIONS = 256
+SESSION_TTL_S = 30 * 60
+MAX_CACHED_ROWS = 50_000
+MAX_DISTINCT_FOR_MATCH = 64
+MAX_ROWS_FOR_SYNTHESIS = 100
+
+FOLLOW_UP_RE = re.compile(
+    r"^(now|only|just|and|but|also|then|what about|how about|same|filter|sort|order|"
+    r"exclude|except|without|show only|keep)\b"
+    r"|\b(those|these|them|ones|the same|instead|of (?:those|these|them))\b",
+    re.IGNORECASE,
+)
+YEAR_RE = re.compile(r"\b(19\d\d|20\d\d)\b")
+LIMIT_RE = re.compile(r"\b(?:top|first)\s+(\d+)\b", re.IGNORECASE)
+# A value mentioned after one of these is excluded: "everything except 2023".
+NEGATION_RE = re.compile(r"\b(exclude|excluding|except|without|not|no|other than|remove|drop)\b")
+# The follow-up asks for an order of its own ("top 5 by rainfall"): not a rule.
+SORT_KEY_RE = re.compile(
+    r"\b(by|highest|lowest|most|least|largest|smallest|biggest|best|worst|sort|sorted|order|ordered|rank)\b"
+)
+
+REFINE_PROMPT = (
+    "A user is refining the answer to a previous question.\n"
+    "Previous question: {prev_question}\n"
+    "Previous SQL: {prev_sql}\n"
+    "The previous result is available as table prev with columns: {columns}\n"
+    "Follow-up: {query_str}\n\n"
+    "If the follow-up can be answered from prev alone, return ONE DuckDB SELECT over prev "
+    "(no other tables). Status values are lowercase, e.g. 'critical', 'over_exploited'.\n"
+    "If it needs columns or rows that prev does not have, return exactly: REGENERATE\n"
+    "Return only the SQL or REGENERATE, no explanations.\n"
+    "SQL:"
+)
+
+SYNTHESIS_PROMPT = (
+    "Given an input question, synthesize a response from the query results.\n"
+    "Query: {query_str}\n"
+    "SQL: {sql_query}\n"
+    "SQL Response: {sql_response_str}\n"
+    "Response: "
+)
+
+
+@dataclass
+class SessionState:
+    question: str
+    sql: str
+    table: Optional[str] = None
+    columns: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+    # Result was cut by the query's own LIMIT: fine to re-limit, but a new
+    # filter may need rows the LIMIT dropped.
+    limited: bool = False
+    touched: float = field(default_factory=time.monotonic)
+
+
+class ConversationStore:
+    """LRU of per-session states plus the DuckDB connection holding results."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_s: float = SESSION_TTL_S):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._states: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # -- DuckDB ------------------------------------------------------------
+    def _db(self):
+        # Temp tables are per connection, so all materialized results live on
+        # one connection checked out of the engine's pool for the process.
+        if self._conn is None:
+            self._conn = rag_pipeline.get_engine().raw_connection()
+        return self._conn.driver_connection
+
+    def clear(self) -> None:
+        """Forget every session (their results were computed on old data)."""
+        with self._lock:
+            for state in self._states.values():
+                self._drop(state)
+            self._states.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._states.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _drop(self, state: SessionState) -> None:
+        if state.table:
+            try:
+                self._db().execute(f"DROP TABLE IF EXISTS {state.table}")
+            except Exception:
+                pass
+
+    def _materialize(self, table: str, sql: str, source: Optional[SessionState] = None):
+        db = self._db()
+        if source is not None:
+            db.execute(f"CREATE OR REPLACE TEMP VIEW prev AS SELECT * FROM {source.table}")
+        db.execute(
+            f"CREATE OR REPLACE TEMP TABLE {table} AS "
+            f"SELECT * FROM ({sql}) AS q LIMIT {MAX_CACHED_ROWS + 1}"
+        )
+        count = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        columns = {row[0]: row[1] for row in db.execute(f"DESCRIBE {table}").fetchall()}
+        return columns, count > MAX_CACHED_ROWS, count
+
+    # -- state -------------------------------------------------------------
+    def get(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return None
+            if time.monotonic() - state.touched > self.ttl_s:
+                self._drop(self._states.pop(session_id))
+                return None
+            state.touched = time.monotonic()
+            self._states.move_to_end(session_id)
+            return state
+
+    def remember(self, session_id: str, question: str, sql: str,
+                 source: Optional[SessionState] = None, source_sql: Optional[str] = None) -> None:
+        """Record a new SQL answer and materialize its result.
+
+        With ``source``, ``source_sql`` is a query over `prev` evaluated
+        against the source's cached table instead of the database.
+        """
+        table = "conv_" + hashlib.sha1(f"{session_id}|{time.time_ns()}".encode()).hexdigest()[:16]
+        state = SessionState(question=question, sql=sql, table=table)
+        with self._lock:
+            try:
+                if source is not None and source.table:
+                    state.columns, truncated, count = self._materialize(table, _strip(source_sql), source)
+                    state.truncated = truncated or source.truncated
+                    state.limited = source.limited or _hits_own_limit(source_sql, count)
+                else:
+                    state.columns, state.truncated, count = self._materialize(table, _strip(sql))
+                    state.limited = _hits_own_limit(sql, count)
+            except Exception as e:
+                print(f"⚠ Could not cache result for refinement: {e}")
+                self._drop(state)
+                state.table = None
+
+            old = self._states.pop(session_id, None)
+            if old is not None:
+                self._drop(old)
+            self._states[session_id] = state
+            while len(self._states) > self.max_sessions:
+                _, evicted = self._states.popitem(last=False)
+                self._drop(evicted)
+
+    def run_on_prev(self, state: SessionState, sql: str, limit: int):
+        with self._lock:
+            db = self._db()
+            db.execute(f"CREATE OR REPLACE TEMP VIEW prev AS SELECT * FROM {state.table}")
+            cur = db.execute(f"SELECT * FROM ({_strip(sql)}) AS q LIMIT {int(limit)}")
+            cols = [d[0] for d in cur.description]
+            return cols, cur.fetchall()
+
+    def tables_read(self, sql: str):
+        with self._lock:
+            return rag_pipeline.tables_read(self._db(), sql)
+
+    def distinct_values(self, state: SessionState, column: str) -> List[str]:
+        with self._lock:
+            rows = self._db().execute(
+                f'SELECT DISTINCT "{column}" FROM {state.table} '
+                f'WHERE "{column}" IS NOT NULL LIMIT {MAX_DISTINCT_FOR_MATCH + 1}'
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+_store = ConversationStore()
+atexit.register(_store.close)
+rag_pipeline.on_reload(lambda version: _store.clear())
+
+
+def _strip(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def _hits_own_limit(sql: str, count: int) -> bool:
+    match = re.search(r"\bLIMIT\s+(\d+)\s*;?\s*$", sql, re.IGNORECASE)
+    return bool(match) and count >= int(match.group(1))
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def is_follow_up(query: str) -> bool:
+    return bool(FOLLOW_UP_RE.search(query.strip()))
+
+
+def _membership(column: str, included: List[str], excluded: List[str]) -> List[str]:
+    where = []
+    if included:
+        where.append(f"{column} IN ({', '.join(included)})")
+    if excluded:
+        where.append(f"{column} NOT IN ({', '.join(excluded)})")
+    return where
+
+
+def _rule_refinement(state: SessionState, query: str) -> Optional[str]:
+    """Filters/limits derivable from the follow-up text alone."""
+    q = query.lower()
+    where = []
+
+    def negated(position: int) -> bool:
+        return bool(NEGATION_RE.search(q, 0, position))
+
+    years = {m.group(1): negated(m.start()) for m in YEAR_RE.finditer(q)}
+    if years and "year" in state.columns:
+        where += _membership("year", sorted(y for y, neg in years.items() if not neg),
+                             sorted(y for y, neg in years.items() if neg))
+
+    # Same length as q, so match positions line up for negated().
+    text = q.replace("-", " ").replace("_", " ")
+    for column, dtype in state.columns.items():
+        if "VARCHAR" not in dtype.upper():
+            continue
+        values = _store.distinct_values(state, column)
+        if len(values) > MAX_DISTINCT_FOR_MATCH:
+            continue
+        included, excluded = [], []
+        # Longest first, blanking matched text, so "semi critical" does not
+        # also match "critical".
+        for v in sorted(values, key=lambda v: -len(str(v))):
+            pattern = r"\b" + re.escape(str(v).lower().replace("_", " ")) + r"\b"
+            match = re.search(pattern, text)
+            if match:
+                (excluded if negated(match.start()) else included).append(_sql_literal(v))
+                text = re.sub(pattern, lambda m: " " * len(m.group()), text)
+        where += _membership(f'"{column}"', included, excluded)
+
+    limit = LIMIT_RE.search(q)
+    if limit and (SORT_KEY_RE.search(q) or not re.search(r"\border\s+by\b", state.sql, re.IGNORECASE)):
+        # "top 5 by rainfall", or a previous result in no particular order:
+        # the first N rows of prev are not what was asked for.
+        return None
+    if not where and not limit:
+        return None
+    if where and state.limited:
+        return None
+
+    sql = "SELECT * FROM prev"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if limit:
+        sql += f" LIMIT {int(limit.group(1))}"
+    return sql
+
+
+async def _llm_refinement(state: SessionState, query: str) -> Optional[str]:
+    prompt = REFINE_PROMPT.format(
+        prev_question=state.question,
+        prev_sql=state.sql,
+        columns=", ".join(f"{c} ({t})" for c, t in state.columns.items()),
+        query_str=query,
+    )
+    completion = await rag_pipeline._stage_llm("sql").acomplete(prompt)
+    sql = str(completion).replace("```sql", "").replace("```", "").strip()
+    if "REGENERATE" in sql.upper() or not rag_pipeline.is_read_only_select(sql):
+        return None
+    # The model may only read prev: no other tables, files or table functions.
+    try:
+        tables = await asyncio.to_thread(_store.tables_read, _strip(sql))
+    except ValueError as e:
+        print(f"⚠ Refinement SQL rejected: {e}")
+        return None
+    if tables != {"prev"}:
+        print(f"⚠ Refinement SQL rejected: reads {', '.join(sorted(tables)) or 'no table'}")
+        return None
+    return sql
+
+
+async def try_refine(session_id: Optional[str], query: str) -> Optional[Dict[str, Any]]:
+    """Answer ``query`` from the session's previous result, or return None."""
+    if not session_id or not is_follow_up(query):
+        return None
+    state = _store.get(session_id)
+    if state is None or not state.table:
+        return None
+
+    # Filtering a truncated relation would silently drop rows.
+    if state.truncated:
+        return None
+
+    sql = await asyncio.to_thread(_rule_refinement, state, query)
+    if sql is None:
+        try:
+            sql = await _llm_refinement(state, query)
+        except Exception as e:
+            print(f"⚠ Refinement prompt failed: {e}")
+            return None
+    if sql is None:
+        return None
+
+    try:
+        cols, rows = await asyncio.to_thread(_store.run_on_prev, state, sql, MAX_ROWS_FOR_SYNTHESIS)
+    except Exception as e:
+        print(f"⚠ Refinement SQL failed on cached result: {e}")
+        return None
+
+    full_sql = f"WITH prev AS ({_strip(state.sql)}) {_strip(sql)}"
+    print(f"♻ Refined from cached result: {sql}")
+
+    completion = await rag_pipeline._stage_llm("synthesis").acomplete(
+        SYNTHESIS_PROMPT.format(
+            query_str=f"{state.question} — follow-up: {query}",
+            sql_query=full_sql,
+            sql_response_str=str([dict(zip(cols, r)) for r in rows]),
+        )
+    )
+
+    await asyncio.to_thread(
+        _store.remember, session_id, f"{state.question} ({query})", full_sql, state, sql
+    )
+    return {"response": str(completion).strip(), "sql_query": full_sql, "refined": True}
+
+
+def contextualize(session_id: Optional[str], query: str) -> str:
+    """Prefix a follow-up with the previous question for full regeneration."""
+    if not session_id or not is_follow_up(query):
+        return query
+    state = _store.get(session_id)
+    if state is None:
+        return query
+    return f"Previous question: {state.question}\nFollow-up question: {query}"
+
+
+def remember(session_id: Optional[str], question: str, sql: Optional[str]) -> None:
+    """Record the SQL behind a fresh answer (runs the materialization)."""
+    if session_id and sql:
+        _store.remember(session_id, question, sql)
@@ -0,0 +1,212 @@
+"""Trigram index over place and state names for query-time entity resolution.
+
+Users misspell places ("Waraseoni", "warasioni") or use other casing, and the
+LLM copies that text straight into `WHERE place = '...'`, which matches
+nothing. Before text-to-SQL, word spans of the question are looked up here —
+exact first, then by trigram similarity — and the canonical values are handed
+to the SQL prompt.
+
+The index is built from the distinct `place`/`state` values of `assessments`
+and rebuilt whenever the data version changes. Lookups are dictionary and
+posting-list operations on a handful of spans, well under a millisecond.
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+import rag_pipeline
+
+MIN_SIMILARITY = 0.6
+MAX_SPAN_WORDS = 3
+MIN_FUZZY_LENGTH = 5
+# Trigrams shared by more names than this are skipped when gathering
+# candidates; the final score is still computed on full trigram sets.
+MAX_POSTINGS = 400
+MAX_CANDIDATES = 8
+MAX_CACHED_SPANS = 20_000
+
+# Words that describe the question rather than name a place.
+STOPWORDS = frozenset("""
+a about above all also an and any are area areas as at average avg be below between bottom by
+compare count critical data database did district districts do does each every exploited for
+from groundwater has have high highest how in irrigated irrigation is it land least list low
+lowest many max maximum mean min minimum more most much not of on only or over percentage
+rainfall record records refill refilled safe same semi show state states status than that the
+their them these those to top total trend use used usage was water were what when where which
+while who with year years
+""".split())
+
+
+@dataclass(frozen=True)
+class Entity:
+    kind: str            # "place" or "state"
+    value: str           # canonical value as stored in assessments
+    state: Optional[str] = None  # state of a place, when known
+
+
+@dataclass
+class Resolution:
+    text: str            # span as written by the user
+    entity: Entity
+    score: float         # 1.0 for exact (case-insensitive) matches
+
+
+def _normalize(name: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+def _trigrams(name: str) -> Set[str]:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, entities: List[Entity]):
+        self.entities = entities
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.grams: List[Set[str]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for i, entity in enumerate(entities):
+            key = _normalize(entity.value)
+            self.exact[key].append(i)
+            grams = _trigrams(key)
+            self.grams.append(grams)
+            for g in grams:
+                self.postings[g].append(i)
+        self._cache: Dict[str, Optional[Tuple[List[int], float]]] = {}
+
+    def lookup(self, span: str) -> Optional[Tuple[List[int], float]]:
+        if span in self._cache:
+            return self._cache[span]
+        hit = self._lookup(span)
+        if len(self._cache) >= MAX_CACHED_SPANS:
+            self._cache.clear()
+        self._cache[span] = hit
+        return hit
+
+    def _lookup(self, span: str) -> Optional[Tuple[List[int], float]]:
+        if span in self.exact:
+            return self.exact[span], 1.0
+        if len(span) < MIN_FUZZY_LENGTH:
+            return None
+
+        grams = _trigrams(span)
+        counts: Counter = Counter()
+        for g in grams:
+            posting = self.postings.get(g)
+            if posting and len(posting) <= MAX_POSTINGS:
+                counts.update(posting)
+        if not counts:
+            return None
+
+        best, best_score = [], 0.0
+        for i, _ in counts.most_common(MAX_CANDIDATES):
+            other = self.grams[i]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score > best_score + 1e-9:
+                best, best_score = [i], score
+            elif abs(score - best_score) <= 1e-9:
+                best.append(i)
+        if best_score < MIN_SIMILARITY:
+            return None
+        return best, best_score
+
+    def resolve(self, question: str) -> List[Resolution]:
+        words = re.findall(r"[a-z0-9]+", question.lower())
+        found: List[Tuple[float, int, int, Resolution]] = []
+        for n in range(MAX_SPAN_WORDS, 0, -1):
+            for start in range(len(words) - n + 1):
+                span_words = words[start:start + n]
+                if all(w in STOPWORDS or w.isdigit() for w in span_words):
+                    continue
+                if span_words[0] in STOPWORDS or span_words[-1] in STOPWORDS:
+                    continue
+                hit = self.lookup(" ".join(span_words))
+                if hit is None:
+                    continue
+                ids, score = hit
+                # Prefer states over same-named places; otherwise first match.
+                ids = sorted(ids, key=lambda i: self.entities[i].kind != "state")
+                found.append((score, n, start, Resolution(" ".join(span_words), self.entities[ids[0]], score)))
+
+        # Best-scoring, longest spans win; spans may not overlap.
+        taken: Set[int] = set()
+        chosen: List[Tuple[int, Resolution]] = []
+        for score, n, start, res in sorted(found, key=lambda f: (-f[0], -f[1], f[2])):
+            cover = set(range(start, start + n))
+            if cover & taken:
+                continue
+            taken |= cover
+            chosen.append((start, res))
+        return [res for _, res in sorted(chosen, key=lambda c: c[0])]
+
+
+_index: Optional[TrigramIndex] = None
+_index_version: Optional[str] = None
+_lock = threading.Lock()
+
+
+def _build(engine) -> TrigramIndex:
+    with engine.connect() as conn:
+        places = conn.execute(text("""
+            SELECT place, MODE(state) AS state
+            FROM assessments
+            WHERE place IS NOT NULL
+            GROUP BY place
+        """)).fetchall()
+        states = conn.execute(text(
+            "SELECT DISTINCT state FROM assessments WHERE state IS NOT NULL AND state <> 'Unknown'"
+        )).fetchall()
+    entities = [Entity("state", s) for (s,) in states]
+    entities += [Entity("place", p, st if st != "Unknown" else None) for p, st in places]
+    return TrigramIndex(entities)
+
+
+def get_index() -> TrigramIndex:
+    """Index for the current data version, rebuilt on change."""
+    global _index, _index_version
+    version = rag_pipeline.data_version()
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = _build(rag_pipeline.get_engine())
+                _index_version = version
+                print(f"🔤 Entity index built: {len(_index.entities)} names")
+    return _index
+
+
+def _rebuild_if_used(version: str) -> None:
+    if _index is not None:
+        get_index()
+
+
+rag_pipeline.on_reload(_rebuild_if_used)
+
+
+def resolve(question: str) -> List[Resolution]:
+    return get_index().resolve(question)
+
+
+def is_known(value: str) -> bool:
+    """True if ``value`` is a stored place or state name (case-insensitive)."""
+    return _normalize(value) in get_index().exact
+
+
+def prompt_hints(question: str) -> str:
+    """SQL comment lines mapping what the user wrote to stored values."""
+    lines = []
+    for r in resolve(question):
+        e = r.entity
+        if e.kind == "state":
+            lines.append(f"-- '{r.text}' means state = '{e.value}'")
+        else:
+            where = f" (in {e.state})" if e.state else ""
+            lines.append(f"-- '{r.text}' means place = '{e.value}'{where}")
+    if not lines:
+        return ""
+    return "\n-- Resolved names, use these exact values:\n" + "\n".join(lines) + "\n"
@@ -0,0 +1,180 @@
+"""Bulk export of an answer's result set: Arrow IPC, Parquet or CSV.
+
+`/api/chat` only feeds the first rows of a result to the LLM. This re-runs the
+SQL behind an answer — given directly (the `sql_query` of a ChatResponse) or
+by `chat_logs` id — and streams the full result without building Python rows:
+DuckDB hands out Arrow record batches and pyarrow writes each one straight to
+the response, so memory stays at about one batch however large the result.
+
+Only a single SELECT over `assessments` / `place_metrics` (and its own CTEs)
+is accepted; table functions such as read_csv() are rejected, so the endpoint
+cannot be used to read files or other tables. Results over `EXPORT_MAX_ROWS`
+(a cross join, say) are refused with 413 before anything is streamed.
+"""
+
+import os
+from typing import Iterator, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+
+import rag_pipeline
+
+router = APIRouter(prefix="/api")
+
+BATCH_ROWS = 64 * 1024
+ALLOWED_TABLES = {"assessments", "place_metrics"}
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "1000000"))  # 0 = no limit
+
+Format = Literal["arrow", "parquet", "csv"]
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv",
+}
+EXTENSIONS = {"arrow": "arrows", "parquet": "parquet", "csv": "csv"}
+
+
+# --------------------------------------------------------------------------
+# VALIDATION
+# --------------------------------------------------------------------------
+def validate(db, sql: str) -> str:
+    """Return ``sql`` stripped, or raise 400 unless it only reads the data tables."""
+    body = sql.strip().rstrip(";").strip()
+    if not rag_pipeline.is_read_only_select(body):
+        raise HTTPException(status_code=400, detail="only a single read-only SELECT can be exported")
+
+    # DuckDB's own parser: rejects non-SELECT statements and table functions
+    # and exposes every table reference, including ones inside subqueries and CTEs.
+    try:
+        tables = rag_pipeline.tables_read(db, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    unknown = tables - ALLOWED_TABLES
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"table(s) not allowed: {', '.join(sorted(unknown))}")
+    return body
+
+
+def check_size(db, body: str) -> None:
+    """Raise 413 if ``body`` returns more than EXPORT_MAX_ROWS rows.
+
+    The count stops at the limit, so an oversized result costs at most that
+    many rows to detect. The newline keeps a trailing ``--`` comment in
+    ``body`` from swallowing the wrapper.
+    """
+    if EXPORT_MAX_ROWS <= 0:
+        return
+    rows = db.execute(
+        f"SELECT count(*) FROM (SELECT 1 FROM ({body}\n) LIMIT {EXPORT_MAX_ROWS + 1})"
+    ).fetchone()[0]
+    if rows > EXPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"result has more than {EXPORT_MAX_ROWS} rows (EXPORT_MAX_ROWS); narrow the query",
+        )
+
+
+def _logged_sql(log_id: int) -> str:
+    with rag_pipeline.get_engine().connect() as conn:
+        sql = conn.execute(
+            text("SELECT sql_query FROM chat_logs WHERE id = :id AND role = 'assistant'"),
+            {"id": log_id},
+        ).scalar()
+    if not sql:
+        raise HTTPException(status_code=404, detail=f"no SQL recorded for chat log {log_id}")
+    return sql
+
+
+# --------------------------------------------------------------------------
+# STREAMING
+# --------------------------------------------------------------------------
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _writer(fmt: str, sink: _ChunkSink, schema):
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if fmt == "arrow":
+        return pyarrow.ipc.new_stream(sink, schema)
+    if fmt == "parquet":
+        return pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    return pyarrow.csv.CSVWriter(sink, schema)
+
+
+def _stream(raw_conn, reader, fmt: str) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    try:
+        writer = _writer(fmt, sink, reader.schema)
+        for batch in reader:
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        writer.close()
+        yield sink.drain()
+    finally:
+        raw_conn.close()
+
+
+@router.get("/export")
+def export(
+    format: Format = Query("csv"),
+    sql: Optional[str] = Query(None, description="sql_query from a /api/chat response"),
+    log_id: Optional[int] = Query(None, description="id of an assistant row in chat_logs"),
+):
+    """Stream the full result of an answer's SQL as Arrow IPC, Parquet or CSV."""
+    if (sql is None) == (log_id is None):
+        raise HTTPException(status_code=400, detail="pass exactly one of sql or log_id")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="export needs pyarrow: pip install pyarrow")
+
+    if log_id is not None:
+        sql = _logged_sql(log_id)
+
+    # The pooled connection stays checked out until the stream finishes.
+    raw_conn = rag_pipeline.get_engine().raw_connection()
+    try:
+        db = raw_conn.driver_connection
+        body = validate(db, sql)
+        check_size(db, body)
+        reader = db.execute(body).to_arrow_reader(BATCH_ROWS)
+    except HTTPException:
+        raw_conn.close()
+        raise
+    except Exception as e:
+        raw_conn.close()
+        raise HTTPException(status_code=400, detail=f"query failed: {e}")
+
+    name = f"export-{log_id}" if log_id is not None else "export"
+    return StreamingResponse(
+        _stream(raw_conn, reader, format),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{EXTENSIONS[format]}"',
+            "X-Data-Version": rag_pipeline.data_version(),
+        },
+    )
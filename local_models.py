@@ -0,0 +1,289 @@
+"""Local CPU model backends for the LlamaIndex pipeline.
+
+These let individual pipeline stages (router selection, text-to-SQL) run on a
+quantized model in-process instead of calling Groq over the network:
+
+- GGUFLLM: llama.cpp via ``llama-cpp-python`` (e.g. a Q4_K_M Llama/Qwen GGUF)
+- ONNXSeq2SeqLLM: an ONNX-exported seq2seq model (e.g. a T5 text-to-SQL
+  checkpoint exported with ``optimum-cli export onnx``) via
+  ``optimum[onnxruntime]``
+
+and let embeddings run without PyTorch:
+
+- ONNXEmbedding: an int8-quantized ONNX export of BAAI/bge-small-en-v1.5 via
+  ``onnxruntime`` + ``tokenizers``, with concurrent requests micro-batched
+
+All dependencies are optional and only imported when a backend is first used.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+
+class _LocalLLM(CustomLLM):
+    """Shared plumbing: lazy load, serialized generation, async via a thread.
+
+    Local runtimes are not safe to call concurrently on one model instance,
+    so generation is serialized with a lock. ``acomplete`` runs generation in
+    a worker thread so the event loop keeps serving other requests.
+    """
+
+    max_tokens: int = 256
+    context_window: int = 4096
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def _model_name(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=self.max_tokens,
+            model_name=self._model_name(),
+        )
+
+    def _locked_generate(self, prompt: str) -> str:
+        with self._lock:
+            return self._generate(prompt).strip()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self._locked_generate(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text = await asyncio.to_thread(self._locked_generate, prompt)
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        text = self._locked_generate(prompt)
+        yield CompletionResponse(text=text, delta=text)
+
+
+class GGUFLLM(_LocalLLM):
+    """Quantized GGUF model served by llama.cpp on CPU."""
+
+    model_path: str
+    n_threads: Optional[int] = None
+    temperature: float = 0.0
+
+    _llama: Any = PrivateAttr(default=None)
+
+    def _model_name(self) -> str:
+        return os.path.basename(self.model_path)
+
+    def _load(self):
+        if self._llama is None:
+            try:
+                from llama_cpp import Llama
+            except ImportError as e:
+                raise RuntimeError(
+                    "❌ GGUF backend needs llama-cpp-python: pip install llama-cpp-python"
+                ) from e
+            self._llama = Llama(
+                model_path=self.model_path,
+                n_ctx=self.context_window,
+                n_threads=self.n_threads,
+                verbose=False,
+            )
+        return self._llama
+
+    def _generate(self, prompt: str) -> str:
+        # Chat completion applies the chat template stored in the GGUF file,
+        # which instruct-tuned models need to follow the prompt format.
+        out = self._load().create_chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+        )
+        return out["choices"][0]["message"]["content"] or ""
+
+
+class ONNXSeq2SeqLLM(_LocalLLM):
+    """ONNX-exported (optionally int8-quantized) seq2seq model on CPU."""
+
+    model_dir: str
+    max_input_tokens: int = 512
+
+    _model: Any = PrivateAttr(default=None)
+    _tokenizer: Any = PrivateAttr(default=None)
+
+    def _model_name(self) -> str:
+        return os.path.basename(os.path.normpath(self.model_dir))
+
+    def _load(self):
+        if self._model is None:
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+                from transformers import AutoTokenizer
+            except ImportError as e:
+                raise RuntimeError(
+                    "❌ ONNX backend needs optimum: pip install 'optimum[onnxruntime]'"
+                ) from e
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            # Keep the end of long prompts: the question sits at the bottom.
+            self._tokenizer.truncation_side = "left"
+            self._model = ORTModelForSeq2SeqLM.from_pretrained(self.model_dir)
+        return self._model, self._tokenizer
+
+    def _generate(self, prompt: str) -> str:
+        model, tokenizer = self._load()
+        inputs = tokenizer(
+            prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.max_input_tokens,
+        )
+        output_ids = model.generate(**inputs, max_new_tokens=self.max_tokens)
+        return tokenizer.decode(output_ids[0], skip_special_tokens=True)
+
+
+class ONNXEmbedding(BaseEmbedding):
+    """bge-style sentence embeddings from an ONNX export, no PyTorch.
+
+    Expects ``model_dir`` to hold ``tokenizer.json`` and an ONNX encoder,
+    preferably the int8 one produced by::
+
+        optimum-cli export onnx --model BAAI/bge-small-en-v1.5 models/bge-small-onnx
+        optimum-cli onnxruntime quantize --onnx_model models/bge-small-onnx \\
+            --avx2 -o models/bge-small-onnx-int8
+
+    Single embeddings (query-time lookups) go through a micro-batcher: callers
+    enqueue, and one worker thread runs whatever arrived within
+    ``max_wait_ms`` (up to ``embed_batch_size``) as one ONNX call.
+    """
+
+    model_dir: str
+    onnx_file: Optional[str] = None
+    max_length: int = 512
+    max_wait_ms: float = 2.0
+    query_instruction: str = "Represent this question for searching relevant passages: "
+    num_threads: Optional[int] = None
+
+    _session: Any = PrivateAttr(default=None)
+    _tokenizer: Any = PrivateAttr(default=None)
+    _input_names: Any = PrivateAttr(default=None)
+    _load_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _queue: Any = PrivateAttr(default=None)
+    _worker: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ONNXEmbedding"
+
+    def _onnx_path(self) -> str:
+        if self.onnx_file:
+            return os.path.join(self.model_dir, self.onnx_file)
+        for name in ("model_quantized.onnx", "model_int8.onnx", "model.onnx"):
+            path = os.path.join(self.model_dir, name)
+            if os.path.exists(path):
+                return path
+        raise RuntimeError(f"❌ No ONNX model found in {self.model_dir}")
+
+    def _load(self):
+        with self._load_lock:
+            if self._session is None:
+                try:
+                    import onnxruntime as ort
+                    from tokenizers import Tokenizer
+                except ImportError as e:
+                    raise RuntimeError(
+                        "❌ ONNX embeddings need onnxruntime and tokenizers: "
+                        "pip install onnxruntime tokenizers"
+                    ) from e
+                options = ort.SessionOptions()
+                if self.num_threads:
+                    options.intra_op_num_threads = self.num_threads
+                self._session = ort.InferenceSession(
+                    self._onnx_path(), options, providers=["CPUExecutionProvider"]
+                )
+                self._input_names = {i.name for i in self._session.get_inputs()}
+                tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+                tokenizer.enable_truncation(max_length=self.max_length)
+                tokenizer.enable_padding()
+                self._tokenizer = tokenizer
+        return self._session, self._tokenizer
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        session, tokenizer = self._load()
+        encodings = tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = session.run(None, feeds)[0]
+        # bge uses the [CLS] token, L2-normalized.
+        cls = hidden[:, 0]
+        cls = cls / np.clip(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12, None)
+        return cls.tolist()
+
+    # -- micro-batching ----------------------------------------------------
+    def _submit(self, text: str) -> concurrent.futures.Future:
+        if self._worker is None:
+            with self._load_lock:
+                if self._worker is None:
+                    self._queue = queue.Queue()
+                    self._worker = threading.Thread(
+                        target=self._batch_loop, name="onnx-embed-batcher", daemon=True
+                    )
+                    self._worker.start()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((text, future))
+        return future
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch: List[Tuple[str, concurrent.futures.Future]] = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.embed_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._encode([text for text, _ in batch])
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    # -- BaseEmbedding -----------------------------------------------------
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._submit(self.query_instruction + query).result()
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(self.query_instruction + query))
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # Already a batch (index build): encode directly.
+        return self._encode(texts)
@@ -0,0 +1,151 @@
+"""Cache prewarming: replay the most frequent recent questions after startup.
+
+After a deploy every cache (answers, SQL results, entity index, translations)
+is cold, and the first users pay full LLM latency for the questions asked most
+yesterday. Once the router is ready, the server mines ``chat_logs`` for the
+most frequent questions of the last ``PREWARM_WINDOW_DAYS`` days per language
+and answers them in the background (lowest scheduler priority), filling the
+answer cache as a real request would.
+
+The replay stops launching questions once ``PREWARM_TIME_S`` seconds or
+``PREWARM_TOKENS`` LLM tokens (usage.py) are spent; questions already in
+flight finish. The report gives the share of the window's questions that a
+warm cache entry now answers (``coverage``) next to the share before.
+
+Prewarming is off unless ``PREWARM_QUESTIONS`` is set: every process start
+(including each auto-reload in development) spends up to the token budget.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+import conversation
+import usage
+from answer_cache import normalize
+
+PREWARM_QUESTIONS = int(os.getenv("PREWARM_QUESTIONS", "0"))  # opt-in: 0 disables
+PREWARM_WINDOW_DAYS = int(os.getenv("PREWARM_WINDOW_DAYS", "7"))
+PREWARM_TIME_S = float(os.getenv("PREWARM_TIME_S", "300"))
+PREWARM_TOKENS = int(os.getenv("PREWARM_TOKENS", "200000"))
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+
+# (question as asked, language, times asked in the window)
+Question = Tuple[str, str, int]
+
+last_report: Optional[Dict[str, Any]] = None
+
+
+def recent_questions(engine, days: int = PREWARM_WINDOW_DAYS) -> List[Question]:
+    """Questions asked in the last ``days`` days, most frequent first.
+
+    Spellings that normalize alike (case, spacing, trailing punctuation) count
+    as one question. Rows logged before languages were recorded are taken as
+    English when ASCII and skipped otherwise.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT content, language, COUNT(*) AS asked
+            FROM chat_logs
+            WHERE role = 'user'
+              AND created_at >= current_timestamp::TIMESTAMP - INTERVAL {int(days)} DAY
+            GROUP BY content, language
+        """)).fetchall()
+
+    merged: Dict[Tuple[str, str], List] = {}
+    for content, language, asked in rows:
+        content = (content or "").strip()
+        if not content:
+            continue
+        if language is None:
+            if not content.isascii():
+                continue
+            language = "en"
+        entry = merged.setdefault((normalize(content), language), [content, language, 0, 0])
+        entry[2] += asked
+        if asked > entry[3]:  # most common spelling represents the group
+            entry[0], entry[3] = content, asked
+
+    questions = [(content, language, asked) for content, language, asked, _ in merged.values()]
+    questions.sort(key=lambda q: -q[2])
+    return questions
+
+
+def coverage(questions: List[Question], is_warm: Callable[[str, str], bool]) -> float:
+    """Share of asked questions (weighted by frequency) a warm cache entry answers."""
+    total = sum(asked for _, _, asked in questions)
+    if not total:
+        return 0.0
+    return sum(asked for q, lang, asked in questions if is_warm(q, lang)) / total
+
+
+async def run(
+    questions: List[Question],
+    warm: Callable[[str, str, float], Awaitable[bool]],
+    is_warm: Callable[[str, str], bool],
+    limit: int = PREWARM_QUESTIONS,
+    time_s: float = PREWARM_TIME_S,
+    tokens: int = PREWARM_TOKENS,
+    concurrency: int = PREWARM_CONCURRENCY,
+) -> Dict[str, Any]:
+    """Replay up to ``limit`` of ``questions`` within the budgets.
+
+    ``warm(question, language, seconds_left)`` answers one question and fills
+    the caches; it returns False if the question could not be cached.
+    """
+    global last_report
+    start = time.monotonic()
+    before = coverage(questions, is_warm)
+    # English follow-ups depend on a session; other languages are checked
+    # after translation when the answer is cached.
+    candidates = [
+        (q, lang) for q, lang, _ in questions
+        if not (lang == "en" and conversation.is_follow_up(q)) and not is_warm(q, lang)
+    ][:max(0, limit)]
+    pending = list(reversed(candidates))
+    stats = {"warmed": 0, "failed": 0, "tokens": 0, "stopped": None}
+
+    def exhausted() -> Optional[str]:
+        if time.monotonic() - start >= time_s:
+            return "time"
+        if stats["tokens"] >= tokens:
+            return "tokens"
+        return None
+
+    async def worker():
+        while pending:
+            stop = exhausted()
+            if stop:
+                stats["stopped"] = stop
+                return
+            question, language = pending.pop()
+            with usage.track() as spend:
+                try:
+                    ok = await warm(question, language, time_s - (time.monotonic() - start))
+                except Exception as e:
+                    print(f"⚠ Prewarm failed for {question[:60]!r}: {e}")
+                    ok = False
+            cost = spend.summary()
+            stats["tokens"] += cost["prompt_tokens"] + cost["completion_tokens"]
+            stats["warmed" if ok else "failed"] += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    last_report = {
+        "window_days": PREWARM_WINDOW_DAYS,
+        "distinct_questions": len(questions),
+        "asked": sum(asked for _, _, asked in questions),
+        "candidates": len(candidates),
+        "warmed": stats["warmed"],
+        "failed": stats["failed"],
+        "skipped": len(pending),
+        "stopped_by": stats["stopped"] or "done",
+        "tokens": stats["tokens"],
+        "seconds": round(time.monotonic() - start, 1),
+        "coverage_before": round(before, 3),
+        "coverage": round(coverage(questions, is_warm), 3),
+    }
+    return last_report
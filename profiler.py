@@ -0,0 +1,132 @@
+"""On-demand profiling of a single /api/chat request (admin only).
+
+``SamplingProfiler`` is a stdlib-only sampling profiler: while running, a
+daemon thread snapshots every thread's Python stack (``sys._current_frames``)
+each ``PROFILE_INTERVAL_MS`` and counts identical stacks. The result is in
+folded-stack format (``thread;outer;...;inner count``), which flamegraph.pl,
+speedscope and inferno render directly. Idle pool workers waiting for work
+are skipped; other requests served concurrently on the event loop do show up,
+so profile on a quiet instance when possible.
+
+``explain_analyze`` runs DuckDB's EXPLAIN ANALYZE on the generated SQL to show
+where query time goes operator by operator.
+
+Nothing here runs unless a request asks for it: with the flag off the cost is
+one ``if``.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import rag_pipeline
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # unset: profiling is disabled
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_STACKS = 2000  # distinct folded stacks returned, most frequent first
+
+# One profile at a time: samples cover the whole process.
+_busy = threading.Lock()
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_pool_worker(frame) -> bool:
+    return frame.f_code.co_name == "_worker" and frame.f_code.co_filename.endswith(
+        os.path.join("concurrent", "futures", "thread.py"))
+
+
+def _idle(frame) -> bool:
+    """A pool worker blocked waiting for its next work item."""
+    if _is_pool_worker(frame):
+        return True  # blocked in the (C) work queue's get()
+    if os.path.basename(frame.f_code.co_filename) not in ("threading.py", "queue.py"):
+        return False
+    while frame is not None:
+        if _is_pool_worker(frame):
+            return True
+        frame = frame.f_back
+    return False
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval_s = interval_ms / 1000
+        self._stacks: collections.Counter = collections.Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        if not _busy.acquire(blocking=False):
+            raise RuntimeError("❌ Another request is being profiled")
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._elapsed = time.perf_counter() - self._started
+        _busy.release()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    def report(self) -> Dict[str, Any]:
+        folded = [f"{stack} {count}" for stack, count in self._stacks.most_common(MAX_STACKS)]
+        return {
+            "wall_ms": round(self._elapsed * 1000),
+            "interval_ms": self.interval_s * 1000,
+            "samples": self._samples,
+            "top": top_frames(folded),
+            "folded": folded,
+        }
+
+
+def explain_analyze(sql: Optional[str]) -> Optional[str]:
+    """DuckDB's per-operator timing of ``sql`` (read-only SELECTs only)."""
+    if not sql or not rag_pipeline.is_read_only_select(sql):
+        return None
+    raw_conn = rag_pipeline.get_engine().raw_connection()
+    try:
+        rows = raw_conn.driver_connection.execute("EXPLAIN ANALYZE " + sql.strip().rstrip(";")).fetchall()
+    finally:
+        raw_conn.close()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def top_frames(folded: List[str], n: int = 15) -> List[Dict[str, Any]]:
+    """Functions most often on top of the stack (self samples), with their caller."""
+    counts: collections.Counter = collections.Counter()
+    for line in folded:
+        stack, _, count = line.rpartition(" ")
+        frames = stack.split(";")
+        caller = frames[-2] if len(frames) > 2 else ""
+        counts[(frames[-1], caller)] += int(count)
+    return [{"frame": frame, "caller": caller, "samples": samples}
+            for (frame, caller), samples in counts.most_common(n)]
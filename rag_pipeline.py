@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import re
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Set
 
 from dotenv import load_dotenv
 from sqlalchemy import (
@@ -10,132 +14,532 @@ from sqlalchemy import (
     String, Integer, Float, text
 )
 
-# LlamaIndex
-from llama_index.llms.groq import Groq
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core import Settings, Document, VectorStoreIndex
-from llama_index.core.query_engine import NLSQLTableQueryEngine, RouterQueryEngine
-from llama_index.core.tools import QueryEngineTool
-from llama_index.core.selectors import LLMSingleSelector
-from llama_index.core import SQLDatabase
-from llama_index.core.prompts import PromptTemplate
-
-import nest_asyncio
-nest_asyncio.apply()
+# LlamaIndex, Groq, embedding backends and nest_asyncio are imported on first
+# use (building the router), so the data-only API — get_engine(),
+# data_version(), is_read_only_select() — and everything importing it start
+# without them. Check with: python check_import_time.py
 
 # Globals
 _INITIALIZED = False
 _engine = None
+_engine_lock = threading.Lock()
 _router = None
+_data_version = None
 
 
 # --------------------------------------------------------------------------
 # 1. LOAD CSV → DuckDB
 # --------------------------------------------------------------------------
+def _files_version(files) -> str:
+    """Content key for the loaded data: names, sizes and mtimes of the CSVs."""
+    h = hashlib.sha1()
+    for f in sorted(files):
+        st = f.stat()
+        h.update(f"{f.name}|{st.st_size}|{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:12]
+
+
+# INGRES_DATA_DIR points the server at another CSV folder, e.g. scale_ingres.py output.
+DATA_DIR = Path(os.getenv("INGRES_DATA_DIR", "data/ingres"))
+
+# Called with the new data version after assessments has been swapped.
+_reload_listeners: List[Callable[[str], None]] = []
+_reload_lock = threading.Lock()
+_seen_version = None
+
+
+def _data_files() -> List[Path]:
+    if not DATA_DIR.exists():
+        raise RuntimeError(f"❌ Folder {DATA_DIR} does NOT exist")
+    files = sorted(DATA_DIR.glob("*.csv"))
+    if not files:
+        raise RuntimeError(f"❌ No CSV files found in {DATA_DIR}/*.csv")
+    return files
+
+
+# Per place × state × year metrics, derived once per load so the LLM can read
+# ratios, status transitions and year-over-year changes instead of writing
+# window functions over raw rows. Duplicate place names within a state and
+# year (separate assessment units) are summed; the status is the worst one.
+# Severity ranks only the extraction categories. 'salinity' (and 'hilly area',
+# 'unknown') is deliberately unranked: CGWB does not assess extraction for
+# saline units, so it is neither better nor worse than 'safe'. Such a status
+# only wins when no unit of the place is ranked, and a change into or out of
+# it has no direction (status_change NULL); salinity → salinity is 'unchanged'.
+PLACE_METRICS_SQL = """
+    CREATE OR REPLACE TABLE place_metrics_staging AS
+    WITH units AS (
+        SELECT *, lower(groundwater_status) AS status,
+               CASE lower(groundwater_status)
+                   WHEN 'safe' THEN 1 WHEN 'semi_critical' THEN 2
+                   WHEN 'critical' THEN 3 WHEN 'over_exploited' THEN 4
+               END AS severity
+        FROM assessments_staging
+        WHERE place IS NOT NULL AND year IS NOT NULL
+    ),
+    per_year AS (
+        SELECT
+            place, state, year,
+            COUNT(*) AS records,
+            AVG(rainfall) AS rainfall,
+            SUM(groundwater_used_total) AS groundwater_used_total,
+            SUM(groundwater_refilled_total) AS groundwater_refilled_total,
+            SUM(groundwater_used_total) * 100.0 / NULLIF(SUM(groundwater_refilled_total), 0) AS extraction_pct,
+            SUM(land_irrigated) AS land_irrigated,
+            SUM(land_total) AS land_total,
+            SUM(land_irrigated) * 100.0 / NULLIF(SUM(land_total), 0) AS irrigated_pct,
+            arg_max(status, COALESCE(severity, 0)) AS groundwater_status,
+            MAX(severity) AS severity
+        FROM units
+        GROUP BY place, state, year
+    )
+    SELECT
+        place, state, year, records, rainfall,
+        groundwater_used_total, groundwater_refilled_total, extraction_pct,
+        land_irrigated, land_total, irrigated_pct, groundwater_status,
+        LAG(year) OVER w AS prev_year,
+        LAG(groundwater_status) OVER w AS prev_status,
+        CASE
+            WHEN groundwater_status = LAG(groundwater_status) OVER w THEN 'unchanged'
+            WHEN severity IS NULL OR LAG(severity) OVER w IS NULL THEN NULL
+            WHEN severity > LAG(severity) OVER w THEN 'worsened'
+            WHEN severity < LAG(severity) OVER w THEN 'improved'
+            ELSE 'unchanged'
+        END AS status_change,
+        groundwater_used_total - LAG(groundwater_used_total) OVER w AS used_change,
+        (groundwater_used_total - LAG(groundwater_used_total) OVER w) * 100.0
+            / NULLIF(LAG(groundwater_used_total) OVER w, 0) AS used_change_pct,
+        (groundwater_refilled_total - LAG(groundwater_refilled_total) OVER w) * 100.0
+            / NULLIF(LAG(groundwater_refilled_total) OVER w, 0) AS refilled_change_pct,
+        extraction_pct - LAG(extraction_pct) OVER w AS extraction_pct_change,
+        irrigated_pct - LAG(irrigated_pct) OVER w AS irrigated_pct_change,
+        (rainfall - LAG(rainfall) OVER w) * 100.0 / NULLIF(LAG(rainfall) OVER w, 0) AS rainfall_change_pct
+    FROM per_year
+    WINDOW w AS (PARTITION BY place, state ORDER BY year)
+    ORDER BY state, place, year
+"""
+PLACE_METRICS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_place_metrics_lookup "
+    "ON place_metrics (state, place, year);"
+)
+
+
 def _ensure_tables(engine):
+    """(Re)load assessments from the CSVs without a moment where it is missing.
+
+    The files are read into `assessments_staging` (and `place_metrics` is
+    derived from it), then one transaction drops the old tables and renames
+    the staging tables into place. Queries already running keep reading the
+    old tables (DuckDB MVCC); new ones see the new ones.
+    """
+    global _data_version
     print("🔄 Loading CSV files...")
 
-    folder = Path("data/ingres")
-    if not folder.exists():
-        raise RuntimeError("❌ Folder data/ingres does NOT exist")
-
-    pattern = str(folder / "*.csv")
-    if not any(folder.glob("*.csv")):
-        raise RuntimeError("❌ No CSV files found in data/ingres/*.csv")
+    # Version the file list before reading it: a file changing mid-load
+    # shows up as a new version on the next check and is loaded again.
+    files = _data_files()
+    version = _files_version(files)
+    file_list = ", ".join("'" + str(f).replace("'", "''") + "'" for f in files)
 
     with engine.begin() as conn:
-        conn.execute(text("DROP TABLE IF EXISTS assessments;"))
         conn.execute(text(f"""
-            CREATE TABLE assessments AS
+            CREATE OR REPLACE TABLE assessments_staging AS
             SELECT * FROM read_csv_auto(
-                '{pattern}',
+                [{file_list}],
                 HEADER=TRUE,
                 UNION_BY_NAME=TRUE
             );
         """))
+        count = conn.execute(text("SELECT COUNT(*) FROM assessments_staging")).scalar()
+        conn.execute(text(PLACE_METRICS_SQL))
+
+    with engine.begin() as conn:
+        for table in ("assessments", "place_metrics"):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table};"))
+            conn.execute(text(f"ALTER TABLE {table}_staging RENAME TO {table};"))
+        conn.execute(text(PLACE_METRICS_INDEX))
+
+    print(f"✅ Loaded {count} rows into assessments")
+    _data_version = version
+
+
+def on_reload(listener: Callable[[str], None]) -> None:
+    """Register ``listener(version)`` to run after the data has been reloaded."""
+    _reload_listeners.append(listener)
+
+
+def reload_if_changed(wait_for_stable: bool = False) -> bool:
+    """Reload assessments if files in DATA_DIR were added, removed or changed.
+
+    With ``wait_for_stable`` (the background watcher) a change is only loaded
+    once two consecutive calls see the same files, so a CSV that is still
+    being copied in is not read half-written.
+
+    Invalidates what was derived from the old data: the router is rebuilt on
+    the next question if the columns changed, and listeners (analytics views,
+    entity index, cached conversation results) are notified. Returns True if
+    a reload happened.
+    """
+    global _router, _seen_version
+    with _reload_lock:
+        engine = get_engine()
+        current = _files_version(_data_files())
+        seen, _seen_version = _seen_version, current
+        if current == _data_version or (wait_for_stable and current != seen):
+            return False
+
+        old_columns = _assessment_columns(engine)
+        _ensure_tables(engine)
+        if _assessment_columns(engine) != old_columns:
+            print("🔄 assessments columns changed; router will be rebuilt")
+            _router = None
+
+        version = _data_version
+    print(f"🔄 Data reloaded, version {version}")
+    for listener in list(_reload_listeners):
+        try:
+            listener(version)
+        except Exception as e:
+            print(f"⚠ Reload listener failed: {e}")
+    return True
+
 
-        count = conn.execute(text("SELECT COUNT(*) FROM assessments")).scalar()
-        print(f"✅ Loaded {count} rows into assessments")
+# --------------------------------------------------------------------------
+# 1b. CHAT LOG STORAGE
+# --------------------------------------------------------------------------
+# `id` breaks ties between rows written in the same transaction (DuckDB's
+# current_timestamp is the transaction start), so (created_at, id) is a
+# strict per-session order usable as a keyset cursor.
+#
+# Rows also record the language the user asked in (cache prewarming replays
+# questions per language), and assistant rows what the turn cost upstream
+# (usage.py): LLM and translation calls, prompt/completion tokens, time spent
+# in those calls and the per-stage breakdown as JSON. Columns added after the
+# keyed layout are added to older tables in place.
+CHAT_LOGS_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id BIGINT DEFAULT nextval('chat_logs_id_seq'),
+        session_id VARCHAR,
+        role VARCHAR,
+        content VARCHAR,
+        sql_query VARCHAR,
+        latency_ms INTEGER,
+        created_at TIMESTAMP DEFAULT current_timestamp,
+        llm_calls INTEGER,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        llm_ms INTEGER,
+        llm_usage VARCHAR,
+        language VARCHAR
+    );
+"""
+CHAT_LOGS_ADDED_COLUMNS = {
+    "llm_calls": "INTEGER",
+    "prompt_tokens": "INTEGER",
+    "completion_tokens": "INTEGER",
+    "llm_ms": "INTEGER",
+    "llm_usage": "VARCHAR",
+    "language": "VARCHAR",
+}
+CHAT_LOGS_COLUMNS = (
+    "id, session_id, role, content, sql_query, latency_ms, created_at, "
+    + ", ".join(CHAT_LOGS_ADDED_COLUMNS)
+)
+# History lookups get no help from an ART index here (DuckDB plans the keyset
+# query as a sequential scan); they rely on chat_logs being kept sorted by
+# (session_id, created_at, id) — see chat_retention.compact_chat_logs — so
+# row-group min/max statistics skip other sessions. Databases created with
+# the old index have it dropped: it only slowed every insert.
+CHAT_LOGS_OLD_INDEX = "idx_chat_logs_session_created"
+
+
+def _ensure_chat_logs(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS chat_logs_id_seq;"))
+
+        cols = {
+            row[0] for row in conn.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = 'chat_logs'"
+            )).fetchall()
+        }
+        if cols and "id" not in cols:
+            # Older databases: rebuild with ids assigned in time order.
+            print("🔄 Migrating chat_logs to keyed layout...")
+            conn.execute(text(CHAT_LOGS_DDL.format(name="chat_logs_migrated")))
+            conn.execute(text("""
+                INSERT INTO chat_logs_migrated (id, session_id, role, content, sql_query, latency_ms, created_at)
+                SELECT nextval('chat_logs_id_seq'), session_id, role, content,
+                       sql_query, latency_ms, created_at
+                FROM (SELECT * FROM chat_logs ORDER BY session_id, created_at)
+            """))
+            conn.execute(text("DROP TABLE chat_logs;"))
+            conn.execute(text("ALTER TABLE chat_logs_migrated RENAME TO chat_logs;"))
+        elif cols:
+            for column, type_ in CHAT_LOGS_ADDED_COLUMNS.items():
+                if column not in cols:
+                    conn.execute(text(f"ALTER TABLE chat_logs ADD COLUMN {column} {type_};"))
+
+        conn.execute(text(CHAT_LOGS_DDL.format(name="chat_logs")))
+        conn.execute(text(f"DROP INDEX IF EXISTS {CHAT_LOGS_OLD_INDEX};"))
 
 
 # --------------------------------------------------------------------------
 # 2. NO REFLECTION — Build Metadata by Hand
 # --------------------------------------------------------------------------
+SQL_TABLES = ["assessments", "place_metrics"]
+
+
+def _assessment_columns(engine, table: str = "assessments"):
+    with engine.begin() as conn:
+        return conn.execute(text(f"PRAGMA table_info('{table}')")).fetchall()
+
+
 def _build_metadata(engine):
     metadata = MetaData()
 
-    with engine.begin() as conn:
-        rows = conn.execute(text("PRAGMA table_info('assessments')")).fetchall()
+    for table_name in SQL_TABLES:
+        cols = []
+        for _, name, dtype, *_ in _assessment_columns(engine, table_name):
+            dtype = dtype.upper()
+
+            if "INT" in dtype:
+                cols.append(Column(name, Integer))
+            elif "DOUBLE" in dtype or "FLOAT" in dtype:
+                cols.append(Column(name, Float))
+            else:
+                cols.append(Column(name, String))
+
+        Table(table_name, metadata, *cols)
+    return metadata
+
+
+# --------------------------------------------------------------------------
+# 3. MODEL PROVIDERS
+# --------------------------------------------------------------------------
+# Each LLM stage can be served by its own backend, chosen by env var:
+#
+#   SELECTOR_LLM   router tool selection
+#   SQL_LLM        text-to-SQL generation
+#   SYNTHESIS_LLM  answer synthesis (SQL results + glossary)
+#
+# Values:
+#   groq[:model]               hosted Groq (default: llama-3.3-70b-versatile)
+#   gguf:/path/model.gguf      local llama.cpp on CPU (llama-cpp-python)
+#   onnx:/path/to/export_dir   local ONNX seq2seq on CPU (optimum[onnxruntime])
+#
+# Local stages skip the WAN round trip and the Groq quota; synthesis usually
+# stays on Groq for answer quality.
+LLM_STAGES = {
+    "selector": "SELECTOR_LLM",
+    "sql": "SQL_LLM",
+    "synthesis": "SYNTHESIS_LLM",
+}
+DEFAULT_GROQ_MODEL = "llama-3.3-70b-versatile"
+
+_llms: Dict[str, Any] = {}
+_llm_specs: Dict[str, str] = {}
+
+
+def _stage_spec(stage: str) -> str:
+    return (os.getenv(LLM_STAGES[stage]) or "groq").strip()
+
+
+def _make_llm(spec: str, groq_key: str | None):
+    provider, _, arg = spec.partition(":")
+    provider = provider.lower()
+
+    if provider == "groq":
+        if not groq_key:
+            raise RuntimeError("❌ No Groq API key found")
+        from llama_index.llms.groq import Groq
+
+        import resilience
+        import resilient_llm
+        # Deadline, hedging and circuit breaker on every Groq call.
+        return resilient_llm.wrap(Groq(model=arg or DEFAULT_GROQ_MODEL, api_key=groq_key), resilience.GROQ)
+
+    if provider == "gguf":
+        from local_models import GGUFLLM
+        return GGUFLLM(
+            model_path=arg,
+            context_window=int(os.getenv("LOCAL_LLM_CTX", "4096")),
+            n_threads=int(os.getenv("LOCAL_LLM_THREADS", "0")) or None,
+        )
+
+    if provider == "onnx":
+        from local_models import ONNXSeq2SeqLLM
+        return ONNXSeq2SeqLLM(model_dir=arg)
+
+    raise RuntimeError(f"❌ Unknown LLM provider '{spec}' (expected groq, gguf or onnx)")
+
+
+# EMBED_BACKEND=huggingface (default, PyTorch) or onnx:/path/to/export_dir
+# (int8 ONNX export of the same model, micro-batched, no PyTorch import).
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+
+
+def _make_embed_model(spec: str):
+    provider, _, arg = spec.strip().partition(":")
+    if provider.lower() == "onnx":
+        from local_models import ONNXEmbedding
+        return ONNXEmbedding(model_name=EMBED_MODEL_NAME, model_dir=arg)
+
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    return HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+
 
-    cols = []
-    for _, name, dtype, *_ in rows:
-        dtype = dtype.upper()
+def _stage_llm(stage: str):
+    """LLM for a pipeline stage; falls back to Settings.llm when not configured."""
+    if stage in _llms:
+        return _llms[stage]
+    from llama_index.core import Settings
+    return Settings.llm
 
-        if "INT" in dtype:
-            cols.append(Column(name, Integer))
-        elif "DOUBLE" in dtype or "FLOAT" in dtype:
-            cols.append(Column(name, Float))
-        else:
-            cols.append(Column(name, String))
 
-    table = Table("assessments", metadata, *cols)
-    return metadata, table
+def _is_local(stage: str) -> bool:
+    return _llm_specs.get(stage, "groq").split(":", 1)[0].lower() in ("gguf", "onnx")
 
 
 # --------------------------------------------------------------------------
-# 3. INITIALIZE MODELS (ASYNC-SAFE)
+# 3b. INITIALIZE MODELS (ASYNC-SAFE)
 # --------------------------------------------------------------------------
 async def _init_models():
     global _INITIALIZED
     if _INITIALIZED:
         return
 
+    from llama_index.core import Settings
+
     load_dotenv()
 
+    specs = {stage: _stage_spec(stage) for stage in LLM_STAGES}
     groq_key = os.getenv("GROQ_API_KEY")
-    if not groq_key:
-        raise RuntimeError("❌ No Groq API key found")
+    if any(spec.split(":", 1)[0].lower() == "groq" for spec in specs.values()):
+        if not groq_key:
+            raise RuntimeError("❌ No Groq API key found")
+        print("🔑 Groq API key loaded")
 
-    print("🔑 Groq API key loaded")
+    import resilient_llm
 
-    # Using Groq with Llama 3.3 70B (latest model)
-    Settings.llm = Groq(
-        model="llama-3.3-70b-versatile",
-        api_key=groq_key
-    )
+    # Stages sharing a spec share one model instance (one load, one lock);
+    # each stage gets its own meter so calls and tokens are accounted per stage.
+    by_spec: Dict[str, Any] = {}
+    for stage, spec in specs.items():
+        if spec not in by_spec:
+            by_spec[spec] = _make_llm(spec, groq_key)
+        _llms[stage] = resilient_llm.meter(by_spec[spec], stage)
+        _llm_specs[stage] = spec
 
-    Settings.embed_model = HuggingFaceEmbedding(
-        model_name="BAAI/bge-small-en-v1.5"
-    )
+    Settings.llm = _llms["synthesis"]
 
-    print("🤖 Models initialized (Groq + Llama 3.1)")
+    Settings.embed_model = _make_embed_model(os.getenv("EMBED_BACKEND", "huggingface"))
+
+    print("🤖 Models initialized: " + ", ".join(f"{k}={v}" for k, v in specs.items()))
     _INITIALIZED = True
 
 
+def _entity_hints(question: str) -> str:
+    """Canonical place/state values for names in the question (may be misspelled)."""
+    import entity_index
+    try:
+        return entity_index.prompt_hints(question)
+    except Exception as e:
+        print(f"⚠ Entity resolution skipped: {e}")
+        return ""
+
+
 # --------------------------------------------------------------------------
 # 4. BUILD ROUTER — NO REFLECTION AT ALL
 # --------------------------------------------------------------------------
+# Worked examples in the text-to-SQL prompt ("Q: ..." / "A: <sql>"). They are
+# also the query shapes benchmark_scale.py times at larger data sizes.
+SQL_EXAMPLES = (
+    "EXAMPLE QUERIES:\n\n"
+    "Q: Which areas use more groundwater than they refill?\n"
+    "A: SELECT place, state, groundwater_used_total, groundwater_refilled_total \n"
+    "   FROM assessments \n"
+    "   WHERE groundwater_used_total > groundwater_refilled_total;\n\n"
+    "Q: What is the average rainfall in Madhya Pradesh?\n"
+    "A: SELECT AVG(rainfall) as avg_rainfall FROM assessments WHERE state = 'Madhya Pradesh';\n\n"
+    "Q: Show top 5 districts with highest groundwater usage\n"
+    "A: SELECT place, state, SUM(groundwater_used_total) as total_usage \n"
+    "   FROM assessments \n"
+    "   GROUP BY place, state \n"
+    "   ORDER BY total_usage DESC LIMIT 5;\n\n"
+    "Q: Count how many areas are over-exploited in each state\n"
+    "A: SELECT state, COUNT(*) as count \n"
+    "   FROM assessments \n"
+    "   WHERE groundwater_status = 'over_exploited' \n"
+    "   GROUP BY state ORDER BY count DESC;\n\n"
+    "Q: What percentage of land is irrigated in Bihar?\n"
+    "A: SELECT (SUM(land_irrigated) * 100.0 / SUM(land_total)) as irrigation_percentage \n"
+    "   FROM assessments WHERE state = 'Bihar';\n\n"
+    "Q: Which areas have rainfall above 1500mm and are still over-exploited?\n"
+    "A: SELECT place, state, rainfall, groundwater_status \n"
+    "   FROM assessments \n"
+    "   WHERE rainfall > 1500 AND groundwater_status = 'over_exploited';\n\n"
+    "Q: Compare groundwater usage vs refill for Rajasthan\n"
+    "A: SELECT SUM(groundwater_used_total) as total_used, \n"
+    "          SUM(groundwater_refilled_total) as total_refilled,\n"
+    "          (SUM(groundwater_used_total) - SUM(groundwater_refilled_total)) as deficit\n"
+    "   FROM assessments WHERE state = 'Rajasthan';\n\n"
+    "Q: Show areas where usage is more than 80% of refill\n"
+    "A: SELECT place, state, groundwater_used_total, groundwater_refilled_total,\n"
+    "          (groundwater_used_total * 100.0 / groundwater_refilled_total) as usage_percent\n"
+    "   FROM assessments \n"
+    "   WHERE groundwater_refilled_total > 0 \n"
+    "   AND (groundwater_used_total * 100.0 / groundwater_refilled_total) > 80;\n\n"
+    "Q: Which places had the biggest rise in extraction in 2023?\n"
+    "A: SELECT place, state, extraction_pct, extraction_pct_change \n"
+    "   FROM place_metrics \n"
+    "   WHERE year = 2023 AND extraction_pct_change IS NOT NULL \n"
+    "   ORDER BY extraction_pct_change DESC LIMIT 10;\n\n"
+    "Q: Which places in Rajasthan got worse in 2023?\n"
+    "A: SELECT place, prev_status, groundwater_status \n"
+    "   FROM place_metrics \n"
+    "   WHERE state = 'Rajasthan' AND year = 2023 AND status_change = 'worsened';\n\n"
+    "Q: What's the trend of safe areas from 2021 to 2024?\n"
+    "A: SELECT year, COUNT(*) as safe_count \n"
+    "   FROM assessments \n"
+    "   WHERE groundwater_status = 'safe' \n"
+    "   GROUP BY year ORDER BY year;\n\n"
+)
+
+
 async def build_router():
-    global _engine, _router
+    global _router
+
+    from llama_index.core import Document, SQLDatabase, VectorStoreIndex
+    from llama_index.core.prompts import PromptTemplate
+    from llama_index.core.indices.struct_store.sql_query import BaseSQLTableQueryEngine
+    from llama_index.core.query_engine import RetrieverQueryEngine, RouterQueryEngine
+    from llama_index.core.retrievers import NLSQLRetriever
+    from llama_index.core.selectors import LLMSingleSelector
+    from llama_index.core.tools import QueryEngineTool
+
+    import nest_asyncio
+    nest_asyncio.apply()
 
     await _init_models()
 
-    if _engine is None:
-        _engine = create_engine("duckdb:///ingres.duckdb")
-        _ensure_tables(_engine)
+    engine = get_engine()
+
+    # Warm the place/state name index so the first question doesn't build it.
+    import entity_index
+    entity_index.get_index()
 
     # Build metadata manually
-    metadata, table = _build_metadata(_engine)
+    metadata = _build_metadata(engine)
 
     # Create SQLDatabase with the pre-built metadata
     sql_db = SQLDatabase(
-        _engine,
+        engine,
         metadata=metadata,
-        include_tables=["assessments"]
+        include_tables=SQL_TABLES
     )
 
     # Enhanced text-to-SQL prompt with examples for tricky numerical queries
-    text_to_sql_prompt = PromptTemplate(
+    sql_schema_rules = (
         "Given an input question, create a syntactically correct SQL query to run.\n\n"
         "DATABASE SCHEMA:\n"
         "Table: assessments\n"
@@ -150,81 +554,95 @@ async def build_router():
         "- land_nonirrigated (FLOAT): non-irrigated land area\n"
         "- land_irrigated (FLOAT): irrigated land area\n"
         "- year (INTEGER): assessment year (2021-2024)\n\n"
+        "Table: place_metrics (one row per place, state and year; precomputed)\n"
+        "Columns:\n"
+        "- place, state, year, records (number of assessment units summed)\n"
+        "- rainfall (FLOAT): average rainfall in mm\n"
+        "- groundwater_used_total, groundwater_refilled_total, land_irrigated, land_total (FLOAT): sums\n"
+        "- extraction_pct (FLOAT): stage of extraction, used * 100 / refilled\n"
+        "- irrigated_pct (FLOAT): irrigated land * 100 / total land\n"
+        "- groundwater_status (VARCHAR): worst status that year\n"
+        "- prev_year (INTEGER), prev_status (VARCHAR): the place's previous assessment\n"
+        "- status_change (VARCHAR): 'worsened', 'improved', 'unchanged' vs prev_year (NULL if none or to/from 'salinity')\n"
+        "- used_change (FLOAT), used_change_pct, refilled_change_pct, rainfall_change_pct (FLOAT): % change vs prev_year\n"
+        "- extraction_pct_change, irrigated_pct_change (FLOAT): percentage-point change vs prev_year\n\n"
         "CRITICAL RULES:\n"
         "1. Status values are LOWERCASE: 'safe', 'semi_critical', 'critical', 'over_exploited'\n"
         "2. For 'sustainably managed' or 'safe' → use groundwater_status = 'safe'\n"
         "3. For 'over-exploited' → use groundwater_status = 'over_exploited'\n"
         "4. State names are case-sensitive: 'Madhya Pradesh', 'Bihar', 'Rajasthan', etc.\n"
-        "5. Use ONLY the 'assessments' table. No JOINs.\n"
+        "5. Query ONE table, no JOINs: place_metrics for extraction percentage, irrigation share, "
+        "status changes and year-over-year changes; assessments for everything else.\n"
         "6. For calculations, use proper SQL functions: SUM(), AVG(), COUNT(), MAX(), MIN()\n"
         "7. For percentages, multiply by 100.0 to avoid integer division\n"
         "8. For comparisons between columns, use proper arithmetic operators\n\n"
-        "EXAMPLE QUERIES:\n\n"
-        "Q: Which areas use more groundwater than they refill?\n"
-        "A: SELECT place, state, groundwater_used_total, groundwater_refilled_total \n"
-        "   FROM assessments \n"
-        "   WHERE groundwater_used_total > groundwater_refilled_total;\n\n"
-        "Q: What is the average rainfall in Madhya Pradesh?\n"
-        "A: SELECT AVG(rainfall) as avg_rainfall FROM assessments WHERE state = 'Madhya Pradesh';\n\n"
-        "Q: Show top 5 districts with highest groundwater usage\n"
-        "A: SELECT place, state, SUM(groundwater_used_total) as total_usage \n"
-        "   FROM assessments \n"
-        "   GROUP BY place, state \n"
-        "   ORDER BY total_usage DESC LIMIT 5;\n\n"
-        "Q: Count how many areas are over-exploited in each state\n"
-        "A: SELECT state, COUNT(*) as count \n"
-        "   FROM assessments \n"
-        "   WHERE groundwater_status = 'over_exploited' \n"
-        "   GROUP BY state ORDER BY count DESC;\n\n"
-        "Q: What percentage of land is irrigated in Bihar?\n"
-        "A: SELECT (SUM(land_irrigated) * 100.0 / SUM(land_total)) as irrigation_percentage \n"
-        "   FROM assessments WHERE state = 'Bihar';\n\n"
-        "Q: Which areas have rainfall above 1500mm and are still over-exploited?\n"
-        "A: SELECT place, state, rainfall, groundwater_status \n"
-        "   FROM assessments \n"
-        "   WHERE rainfall > 1500 AND groundwater_status = 'over_exploited';\n\n"
-        "Q: Compare groundwater usage vs refill for Rajasthan\n"
-        "A: SELECT SUM(groundwater_used_total) as total_used, \n"
-        "          SUM(groundwater_refilled_total) as total_refilled,\n"
-        "          (SUM(groundwater_used_total) - SUM(groundwater_refilled_total)) as deficit\n"
-        "   FROM assessments WHERE state = 'Rajasthan';\n\n"
-        "Q: Show areas where usage is more than 80% of refill\n"
-        "A: SELECT place, state, groundwater_used_total, groundwater_refilled_total,\n"
-        "          (groundwater_used_total * 100.0 / groundwater_refilled_total) as usage_percent\n"
-        "   FROM assessments \n"
-        "   WHERE groundwater_refilled_total > 0 \n"
-        "   AND (groundwater_used_total * 100.0 / groundwater_refilled_total) > 80;\n\n"
-        "Q: What's the trend of safe areas from 2021 to 2024?\n"
-        "A: SELECT year, COUNT(*) as safe_count \n"
-        "   FROM assessments \n"
-        "   WHERE groundwater_status = 'safe' \n"
-        "   GROUP BY year ORDER BY year;\n\n"
+    )
+    sql_instructions = (
         "IMPORTANT: Return ONLY the SQL query, with NO explanations, NO markdown, NO additional text.\n"
         "Just the raw SQL query that can be executed directly.\n\n"
         "Question: {query_str}\n"
         "SQL Query:"
     )
 
-    # Create the SQL query engine
-    # Note: By default, NLSQLTableQueryEngine will execute the SQL and synthesize a response
-    # The key is to ensure the text-to-SQL prompt returns ONLY the SQL query, not explanations
-    base_sql = NLSQLTableQueryEngine(
-        sql_database=sql_db,
-        tables=["assessments"],
-        text_to_sql_prompt=text_to_sql_prompt
-    )
+    # Local CPU models pay for every prompt token in prefill time, so they
+    # get the schema and rules without the worked examples.
+    if _is_local("sql"):
+        text_to_sql_prompt = PromptTemplate(sql_schema_rules + sql_instructions)
+    else:
+        text_to_sql_prompt = PromptTemplate(sql_schema_rules + SQL_EXAMPLES + sql_instructions)
+
+    class SQLEngine(BaseSQLTableQueryEngine):
+        """NLSQLTableQueryEngine over a given retriever: text-to-SQL and
+        synthesis use different stage models, and the retriever may be wrapped."""
+
+        def __init__(self, sql_retriever, **kwargs):
+            self._sql_retriever = sql_retriever
+            super().__init__(**kwargs)
+
+        @property
+        def sql_retriever(self):
+            return self._sql_retriever
 
     class SafeSQLEngine:
         def __init__(self, inner):
             self.inner = inner
 
+        @staticmethod
+        def prompt_for(q) -> str:
+            return str(q) + _entity_hints(str(q)) + "\n-- Use ONE table (assessments or place_metrics). No JOINs.\n"
+
+        @staticmethod
+        def question_of(prompt: str) -> str:
+            return prompt.split("\n-- ", 1)[0].strip()
+
         async def aquery(self, q):
-            return await self.inner.aquery(
-                str(q) + "\n-- Use ONLY assessments table. No JOINs.\n"
-            )
+            return await self.inner.aquery(self.prompt_for(q))
+
+    # The text-to-SQL prompt returns ONLY the SQL query; the engine runs it and
+    # synthesizes the answer.
+    sql_retriever = NLSQLRetriever(
+        sql_db,
+        tables=SQL_TABLES,
+        text_to_sql_prompt=text_to_sql_prompt,
+        llm=_stage_llm("sql"),
+    )
+
+    # Questions shaped like an earlier one (same words, other place, state,
+    # status or number) run that question's SQL as a prepared statement
+    # instead of calling the text-to-SQL model.
+    import sql_templates
+    if sql_templates.SQL_TEMPLATES:
+        sql_retriever = sql_templates.TemplateRetriever(sql_retriever, sql_db, SafeSQLEngine.question_of)
+
+    import speculative_router
+    if speculative_router.SPECULATIVE_ROUTING:
+        sql_retriever = speculative_router.PrefetchingRetriever(sql_retriever, "aretrieve_with_metadata")
+
+    base_sql = SQLEngine(sql_retriever, llm=_stage_llm("synthesis"))
 
     sql_tool = QueryEngineTool.from_defaults(
         query_engine=SafeSQLEngine(base_sql),
+        name="sql",
         description=(
             "SQL tool for querying groundwater assessment data. "
             "The 'assessments' table has these columns: "
@@ -276,17 +694,33 @@ async def build_router():
         Document(text="Example: Critical areas with high usage → SELECT place, state FROM assessments WHERE groundwater_status IN ('critical', 'over_exploited') AND groundwater_used_total > 5000"),
         Document(text="Example: Safe areas with low rainfall → SELECT place, state, rainfall FROM assessments WHERE groundwater_status = 'safe' AND rainfall < 800")
     ]
-    vect_engine = VectorStoreIndex.from_documents(glossary).as_query_engine()
+    vect_retriever = VectorStoreIndex.from_documents(glossary).as_retriever()
+    if speculative_router.SPECULATIVE_ROUTING:
+        vect_retriever = speculative_router.PrefetchingRetriever(vect_retriever, "aretrieve")
+    vect_engine = RetrieverQueryEngine.from_args(vect_retriever, llm=_stage_llm("synthesis"))
 
     vect_tool = QueryEngineTool.from_defaults(
         query_engine=vect_engine,
+        name="glossary",
         description="Definition lookups for groundwater terminology and database schema"
     )
 
-    _router = RouterQueryEngine(
-        selector=LLMSingleSelector.from_defaults(),
-        query_engine_tools=[sql_tool, vect_tool]
-    )
+    selector = LLMSingleSelector.from_defaults(llm=_stage_llm("selector"))
+    tools = [sql_tool, vect_tool]
+
+    if not speculative_router.SPECULATIVE_ROUTING:
+        _router = RouterQueryEngine(selector=selector, query_engine_tools=tools)
+        return _router
+
+    # Text-to-SQL and the glossary lookup start alongside the selector; the
+    # chosen tool picks up its result. Speculative text-to-SQL takes its own
+    # Groq slot, or doesn't start. A local SQL model would compete with the
+    # selector for the same CPU, so it is not speculated.
+    import scheduler
+    branches = {1: speculative_router.Branch(vect_retriever, str)}
+    if not _is_local("sql"):
+        branches[0] = speculative_router.Branch(sql_retriever, SafeSQLEngine.prompt_for, scheduler.GROQ)
+    _router = speculative_router.SpeculativeRouter(selector, tools, branches)
 
     return _router
 
@@ -294,6 +728,83 @@ async def build_router():
 # --------------------------------------------------------------------------
 # PUBLIC API
 # --------------------------------------------------------------------------
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|drop|create|alter|copy|attach|detach|install|load|"
+    r"pragma|set|reset|export|import|call|checkpoint|vacuum|truncate|grant|begin|commit)\b",
+    re.IGNORECASE,
+)
+
+
+def is_read_only_select(sql: str) -> bool:
+    """True for a single SELECT/WITH statement with no write or admin keywords."""
+    body = sql.strip().rstrip(";").strip()
+    if not body or ";" in body:
+        return False
+    if not re.match(r"^(select|with)\b", body, re.IGNORECASE):
+        return False
+    # Ignore keywords inside string literals, e.g. WHERE place = 'Load'.
+    return not _WRITE_KEYWORDS.search(re.sub(r"'(?:[^']|'')*'", "''", body))
+
+
+def _walk_tables(node, ctes: Set[str], tables: Set[str]) -> None:
+    if isinstance(node, dict):
+        if node.get("type") == "TABLE_FUNCTION":
+            name = node.get("function", {}).get("function_name", "?")
+            raise ValueError(f"table function {name}() is not allowed")
+        if node.get("type") == "BASE_TABLE":
+            tables.add(node.get("table_name", "").lower())
+        cte_map = node.get("cte_map")
+        if isinstance(cte_map, dict):
+            ctes.update(entry["key"].lower() for entry in cte_map.get("map", []))
+        for value in node.values():
+            _walk_tables(value, ctes, tables)
+    elif isinstance(node, list):
+        for value in node:
+            _walk_tables(value, ctes, tables)
+
+
+def tables_read(db, sql: str) -> Set[str]:
+    """Tables a single SELECT reads, its own CTEs excluded, per DuckDB's parser.
+
+    ``db`` is any DuckDB connection (nothing is executed). Raises ValueError
+    for invalid SQL, several statements, or table functions such as
+    read_csv() — so callers can allow-list what the SQL may touch.
+    """
+    tree = json.loads(db.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    if tree.get("error"):
+        raise ValueError(f"invalid SQL: {tree.get('error_message')}")
+    if len(tree["statements"]) != 1:
+        raise ValueError("only a single statement is allowed")
+    ctes: Set[str] = set()
+    tables: Set[str] = set()
+    _walk_tables(tree["statements"], ctes, tables)
+    return tables - ctes
+
+
+def data_version() -> str:
+    """Key of the currently loaded data; changes whenever assessments is reloaded."""
+    get_engine()
+    return _data_version
+
+
+def get_engine():
+    """Database engine with data and chat_logs tables ready (no models needed)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine("duckdb:///ingres.duckdb")
+                try:
+                    _ensure_tables(engine)
+                    _ensure_chat_logs(engine)
+                except BaseException:
+                    engine.dispose()
+                    raise
+                # Published only once set up: other threads never see a half-loaded engine.
+                _engine = engine
+    return _engine
+
+
 async def get_router():
     global _router
     if _router is None:
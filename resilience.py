@@ -0,0 +1,337 @@
+"""Deadlines, hedged requests and circuit breakers for upstream providers.
+
+Tail latency of a chat answer is set by Groq (routing, SQL, synthesis) and
+Gemini (translation). Every call to them goes through a ``Provider``:
+
+- Deadline: `/api/chat` opens a ``deadline(seconds)`` scope; it flows through
+  tasks and worker threads (contextvars), and no attempt outlives it.
+- Hedging: if an attempt has not answered after the provider's recent p95
+  latency, a second identical attempt is sent and the first answer wins. An
+  attempt that fails early is retried once the same way. Rate-limited
+  providers (Gemini) are not hedged.
+- Rate limits: a 429 / quota error is never hedged or retried. The provider
+  backs off for the server's ``Retry-After`` (else ``RATE_LIMIT_BACKOFF_S``,
+  doubling while 429s continue, up to ``RATE_LIMIT_BACKOFF_MAX_S``) and calls
+  fail fast with ``ProviderUnavailable`` meanwhile. Rate limits and deadline
+  expiry (a budget the caller chose) don't count towards the breaker.
+- Circuit breaker: after ``BREAKER_FAILURES`` failures in a row the provider
+  is skipped for ``BREAKER_RESET_S``; calls fail fast with
+  ``ProviderUnavailable`` so callers can fall back (cached answer, template,
+  untranslated text). Then one trial call decides whether it closes again.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "30"))
+# Hedge delay before enough latencies are known, and its bounds after.
+HEDGE_INITIAL_S = float(os.getenv("HEDGE_INITIAL_S", "2.0"))
+HEDGE_MIN_S = float(os.getenv("HEDGE_MIN_S", "0.05"))
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = 20
+RATE_LIMIT_BACKOFF_S = float(os.getenv("RATE_LIMIT_BACKOFF_S", "10"))
+RATE_LIMIT_BACKOFF_MAX_S = float(os.getenv("RATE_LIMIT_BACKOFF_MAX_S", "120"))
+LATENCY_WINDOW = 200
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+# Sync calls (Gemini SDK) run their attempts here so a hedge can start while
+# the first attempt is still blocked.
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider")
+
+
+class ProviderUnavailable(RuntimeError):
+    """The provider is failing, too slow for the deadline, or its breaker is open."""
+
+
+def is_unavailable(exc: BaseException) -> bool:
+    """True if ``exc`` or anything it was raised from is ProviderUnavailable."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, ProviderUnavailable):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|rate.?limit|too many requests|resource.?exhausted|quota", re.I)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for HTTP 429 / quota errors (Groq RateLimitError, Gemini ResourceExhausted)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+            return True
+        if _RATE_LIMIT_TEXT.search(f"{type(exc).__name__} {exc}"):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from the response's Retry-After header, when the SDK exposes it."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------------------------------------------------------
+# DEADLINES
+# --------------------------------------------------------------------------
+@contextlib.contextmanager
+def deadline(seconds: Optional[float], detach: bool = False):
+    """Bound everything called inside (including threads/tasks started here).
+
+    Nested scopes can only tighten the outer deadline, unless ``detach`` is
+    set (background work started from a request that must not inherit it).
+    """
+    outer = None if detach else _deadline.get()
+    if not seconds or seconds <= 0:
+        at = outer
+    else:
+        at = time.monotonic() + seconds
+        at = at if outer is None else min(at, outer)
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current deadline, or None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+# --------------------------------------------------------------------------
+# PROVIDER
+# --------------------------------------------------------------------------
+class Provider:
+    """Breaker, latency window and hedging policy for one upstream API."""
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_s: float = BREAKER_RESET_S,
+                 hedge: bool = True):
+        self.name = name
+        self.failures = failures
+        self.reset_s = reset_s
+        self.hedge = hedge
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._backoff_s = 0.0
+        self._backoff_until: Optional[float] = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failures": 0, "rejected": 0,
+                      "rate_limited": 0, "deadline_expired": 0}
+
+    # -- breaker -----------------------------------------------------------
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_s:
+            return "open"
+        return "half_open"
+
+    def _admit(self) -> bool:
+        """Whether a call may go out now; True means it is the half-open trial."""
+        left = time_left()
+        with self._lock:
+            self.stats["calls"] += 1
+            if left is not None and left <= 0:
+                self.stats["rejected"] += 1
+                raise ProviderUnavailable(f"{self.name}: deadline exceeded")
+            if self._backing_off():
+                self.stats["rejected"] += 1
+                raise ProviderUnavailable(
+                    f"{self.name}: rate limited, retry in {self._backoff_until - time.monotonic():.0f}s")
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.stats["rejected"] += 1
+            raise ProviderUnavailable(f"{self.name}: circuit open")
+
+    def _success(self, seconds: float, trial: bool) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._backoff_s = 0.0
+            if trial:
+                self._trial_running = False
+
+    def _failure(self, trial: bool) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self._consecutive_failures += 1
+            if trial:
+                self._trial_running = False
+            if trial or self._consecutive_failures >= self.failures:
+                if self._opened_at is None or trial:
+                    print(f"⚠ {self.name} circuit opened after {self._consecutive_failures} failures")
+                self._opened_at = time.monotonic()
+
+    def _abandon(self, trial: bool) -> None:
+        """The call was cancelled: no verdict, but the trial slot is free again."""
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def _rate_limited(self, trial: bool, error: BaseException) -> ProviderUnavailable:
+        """Back off instead of retrying; the breaker is left alone."""
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self._backoff_s = min(RATE_LIMIT_BACKOFF_MAX_S, max(RATE_LIMIT_BACKOFF_S, self._backoff_s * 2))
+            wait = _retry_after(error) or self._backoff_s
+            self._backoff_until = time.monotonic() + wait
+            if trial:
+                self._trial_running = False
+        print(f"⚠ {self.name} rate limited, backing off {wait:.0f}s")
+        return ProviderUnavailable(f"{self.name}: rate limited, retry in {wait:.0f}s")
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_S
+        return max(HEDGE_MIN_S, samples[min(len(samples) - 1, int(HEDGE_QUANTILE * len(samples)))])
+
+    def _backing_off(self) -> bool:
+        return self._backoff_until is not None and time.monotonic() < self._backoff_until
+
+    def _may_hedge(self, trial: bool) -> bool:
+        # A half-open trial probes with one request only; a 429 elsewhere means no extra load.
+        return self.hedge and not trial and not self._backing_off()
+
+    def snapshot(self) -> Dict[str, Any]:
+        backoff = 0.0 if self._backoff_until is None else max(0.0, self._backoff_until - time.monotonic())
+        return {"state": self.state, "hedge_delay_ms": round(self.hedge_delay() * 1000),
+                "backoff_s": round(backoff, 1), **self.stats}
+
+    # -- calls -------------------------------------------------------------
+    def _wait_time(self, hedged: bool, trial: bool) -> Optional[float]:
+        left = time_left()
+        if hedged or not self._may_hedge(trial):
+            return left
+        return self.hedge_delay() if left is None else min(left, self.hedge_delay())
+
+    def _give_up(self, trial: bool, error: Optional[BaseException]):
+        if error is None:
+            # Only the caller's deadline ran out: no verdict on the provider.
+            with self._lock:
+                self.stats["deadline_expired"] += 1
+            self._abandon(trial)
+            return ProviderUnavailable(f"{self.name}: deadline exceeded")
+        self._failure(trial)
+        return ProviderUnavailable(f"{self.name}: {error}")
+
+    async def acall(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``attempt()`` under deadline, hedging and the breaker."""
+        trial = self._admit()
+        started = {asyncio.ensure_future(attempt()): time.monotonic()}
+        hedge = None
+        error: Optional[BaseException] = None
+        try:
+            while started:
+                done, _ = await asyncio.wait(
+                    started, timeout=self._wait_time(hedge is not None, trial),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    began = started.pop(task)
+                    if task.exception() is None:
+                        self._win(time.monotonic() - began, trial, task is hedge)
+                        return task.result()
+                    error = task.exception()
+                    if is_rate_limited(error):
+                        raise self._rate_limited(trial, error) from error
+                left = time_left()
+                if left is not None and left <= 0:
+                    break
+                if hedge is None and self._may_hedge(trial):
+                    # Hedge a slow attempt, or retry a failed one, once.
+                    hedge = asyncio.ensure_future(attempt())
+                    started[hedge] = time.monotonic()
+                    self.stats["hedged"] += 1
+        except BaseException:
+            # Cancelled (e.g. a losing speculative branch) or interrupted.
+            self._abandon(trial)
+            raise
+        finally:
+            for task in started:
+                task.cancel()
+        raise self._give_up(trial, error) from error
+
+    def call(self, attempt: Callable[[], Any]) -> Any:
+        """Blocking counterpart of ``acall`` for sync SDKs; attempts run in threads."""
+        trial = self._admit()
+        context = contextvars.copy_context()
+        started = {_executor.submit(context.copy().run, attempt): time.monotonic()}
+        hedge = None
+        error: Optional[BaseException] = None
+        try:
+            while started:
+                done, _ = concurrent.futures.wait(
+                    started, timeout=self._wait_time(hedge is not None, trial),
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    began = started.pop(future)
+                    if future.exception() is None:
+                        self._win(time.monotonic() - began, trial, future is hedge)
+                        return future.result()
+                    error = future.exception()
+                    if is_rate_limited(error):
+                        raise self._rate_limited(trial, error) from error
+                left = time_left()
+                if left is not None and left <= 0:
+                    break
+                if hedge is None and self._may_hedge(trial):
+                    hedge = _executor.submit(context.copy().run, attempt)
+                    started[hedge] = time.monotonic()
+                    self.stats["hedged"] += 1
+        except BaseException:
+            # Cancelled (e.g. a losing speculative branch) or interrupted.
+            self._abandon(trial)
+            raise
+        finally:
+            # Threads cannot be interrupted; a losing attempt finishes and is discarded.
+            for future in started:
+                future.cancel()
+        raise self._give_up(trial, error) from error
+
+    def _win(self, seconds: float, trial: bool, by_hedge: bool) -> None:
+        if by_hedge:
+            self.stats["hedge_wins"] += 1
+        self._success(seconds, trial)
+
+
+GROQ = Provider("groq")
+# Not hedged: TranslationService spaces Gemini requests under one rate lock,
+# so a hedge would queue behind its own primary and double the request rate.
+GEMINI = Provider("gemini", hedge=False)
+PROVIDERS = {p.name: p for p in (GROQ, GEMINI)}
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """Breaker state, hedge delay and counters per provider."""
+    return {name: p.snapshot() for name, p in PROVIDERS.items()}
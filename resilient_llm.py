@@ -0,0 +1,97 @@
+"""LlamaIndex LLM wrappers: resilience and per-stage usage accounting.
+
+The router, text-to-SQL retriever and synthesizer all call their LLM through
+``complete``/``acomplete`` (prompts are formatted by LlamaIndex), so wrapping
+the Groq model here gives each of those calls the request deadline, hedging
+and the circuit breaker without touching the query engines. ``meter`` wraps a
+stage's model so each call is accounted to that stage (usage.py).
+"""
+
+import time
+from typing import Any
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import LLM, CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+import resilience
+import usage
+
+
+class ResilientLLM(CustomLLM):
+    _inner: Any = PrivateAttr()
+    _provider: Any = PrivateAttr()
+
+    def __init__(self, inner: LLM, provider: resilience.Provider, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._inner = inner
+        self._provider = provider
+
+    @property
+    def inner(self) -> LLM:
+        return self._inner
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        # Completion interface: LlamaIndex formats prompts before calling us.
+        return self._inner.metadata.model_copy(update={"is_chat_model": False})
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._provider.call(lambda: self._inner.complete(prompt, formatted=formatted, **kwargs))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._provider.acall(lambda: self._inner.acomplete(prompt, formatted=formatted, **kwargs))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+        yield CompletionResponse(text=response.text, delta=response.text)
+
+
+def wrap(llm: LLM, provider: resilience.Provider) -> ResilientLLM:
+    return ResilientLLM(llm, provider)
+
+
+class MeteredLLM(CustomLLM):
+    _inner: Any = PrivateAttr()
+    _stage: str = PrivateAttr()
+
+    def __init__(self, inner: LLM, stage: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._inner = inner
+        self._stage = stage
+
+    @property
+    def inner(self) -> LLM:
+        return self._inner
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self._inner.metadata.model_copy(update={"is_chat_model": False})
+
+    def _record(self, prompt: str, response: CompletionResponse, start: float) -> CompletionResponse:
+        usage.record(self._stage, self._inner.metadata.model_name, time.perf_counter() - start,
+                     prompt, response.text, usage.reported_tokens(response))
+        return response
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        start = time.perf_counter()
+        return self._record(prompt, self._inner.complete(prompt, formatted=formatted, **kwargs), start)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        start = time.perf_counter()
+        return self._record(prompt, await self._inner.acomplete(prompt, formatted=formatted, **kwargs), start)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+        yield CompletionResponse(text=response.text, delta=response.text)
+
+
+def meter(llm: LLM, stage: str) -> MeteredLLM:
+    return MeteredLLM(llm, stage)
+
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Synthetic INGRES data at N× the size of data/ingres, for scaling tests.
+
+Every real row is kept (replica 0) and N-1 synthetic replicas of it are added.
+Replica k of place "nalchha" is the place "nalchha-k" in the same state, with
+the same years and status history, so state, status and year distributions
+are preserved exactly and place cardinality grows N×. Numeric columns get
+lognormal noise that is fixed per synthetic place (its trajectory across
+years keeps the real year-over-year changes) plus a small per-row jitter:
+
+- all groundwater columns share one factor, so used / refilled — and with it
+  the groundwater_status — stays consistent;
+- land columns share another, so irrigated + non-irrigated = total still holds;
+- rainfall varies less (it is regional).
+
+Output is one CSV per year with the original header, so it loads through
+rag_pipeline._ensure_tables; set INGRES_DATA_DIR to the output directory to serve it:
+
+    python scale_ingres.py --scale 10 --out data/ingres_x10
+    python scale_ingres.py --scale 100 --out /tmp/ingres_x100 --without-state
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict
+
+import duckdb
+
+SOURCE_DIR = Path("data/ingres")
+
+GROUNDWATER_COLUMNS = [
+    "groundwater_refilled_total", "groundwater_refilled_irrigated", "groundwater_refilled_nonirrigated",
+    "groundwater_used_total", "groundwater_used_nonirrigated",
+]
+LAND_COLUMNS = ["land_irrigated", "land_nonirrigated", "land_total"]
+
+# Spread (sigma of the log factor) per synthetic place, and per row.
+PLACE_SIGMA = {"gw": 0.25, "land": 0.2, "rain": 0.08}
+ROW_SIGMA = 0.03
+
+
+def _normal(*key: str) -> str:
+    """SQL for a standard normal draw that is a deterministic function of ``key``."""
+    args = ", ".join(key)
+    u1 = f"((hash({args}, 'u1') % 1000000) + 1) / 1000001.0"
+    u2 = f"(hash({args}, 'u2') % 1000000) / 1000000.0"
+    return f"(sqrt(-2 * ln({u1})) * cos(2 * pi() * {u2}))"
+
+
+def _factor(kind: str) -> str:
+    place = _normal("place", "state", "k", "seed", f"'{kind}'")
+    row = _normal("place", "state", "k", "seed", "year", f"'{kind}'")
+    return f"CASE WHEN k = 0 THEN 1.0 ELSE exp({PLACE_SIGMA[kind]} * {place} + {ROW_SIGMA} * {row}) END"
+
+
+def generate(scale: int, out_dir: Path, source_dir: Path = SOURCE_DIR, seed: int = 0,
+             with_state: bool = True) -> Dict[str, object]:
+    """Write ``scale``× the rows of ``source_dir`` to ``out_dir``; returns counts and timing."""
+    if scale < 1:
+        raise ValueError("scale must be >= 1")
+    files = sorted(source_dir.glob("*.csv"))
+    if not files:
+        raise RuntimeError(f"❌ No CSV files found in {source_dir}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in out_dir.glob("*.csv"):
+        old.unlink()
+
+    start = time.perf_counter()
+    con = duckdb.connect()
+    file_list = ", ".join("'" + str(f).replace("'", "''") + "'" for f in files)
+    con.execute(f"CREATE TABLE real AS SELECT * FROM read_csv_auto([{file_list}], HEADER=TRUE, UNION_BY_NAME=TRUE)")
+    columns = [row[0] for row in con.execute("DESCRIBE real").fetchall()]
+
+    def value(column: str) -> str:
+        if column == "place":
+            return "CASE WHEN k = 0 THEN place ELSE place || '-' || k END AS place"
+        if column in GROUNDWATER_COLUMNS:
+            return f"round({column} * gw, 2) AS {column}"
+        if column in LAND_COLUMNS:
+            return f"round({column} * land) AS {column}"
+        if column == "rainfall":
+            return f"round(rainfall * rain, 1) AS rainfall"
+        return column
+
+    kept = [c for c in columns if with_state or c != "state"]
+    con.execute(f"""
+        CREATE TABLE scaled AS
+        SELECT {", ".join(value(c) for c in kept)}
+        FROM (
+            SELECT real.*, k, {seed} AS seed,
+                   {_factor("gw")} AS gw, {_factor("land")} AS land, {_factor("rain")} AS rain
+            FROM real, range({scale}) AS replicas(k)
+        )
+        ORDER BY year, k, place
+    """)
+
+    years = [row[0] for row in con.execute("SELECT DISTINCT year FROM scaled ORDER BY year").fetchall()]
+    for year in years:
+        out_file = out_dir / f"groundwater_{year}.csv"
+        con.execute(f"COPY (SELECT * FROM scaled WHERE year = {int(year)}) TO '{out_file.as_posix()}' (HEADER)")
+    rows = con.execute("SELECT COUNT(*) FROM scaled").fetchone()[0]
+    con.close()
+
+    return {
+        "scale": scale,
+        "rows": rows,
+        "files": len(years),
+        "bytes": sum(f.stat().st_size for f in out_dir.glob("*.csv")),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scale", type=int, required=True, help="multiple of the real row count, e.g. 10")
+    p.add_argument("--out", required=True, help="output directory (its CSVs are replaced)")
+    p.add_argument("--source", default=str(SOURCE_DIR))
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--without-state", action="store_true",
+                   help="omit the state column (input format for add_state_column.py)")
+    args = p.parse_args()
+
+    info = generate(args.scale, Path(args.out), Path(args.source), args.seed, not args.without_state)
+    print(f"✅ {info['rows']} rows in {info['files']} files ({info['bytes'] / 2**20:.1f} MB) "
+          f"written to {args.out} in {info['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Admission control and priority scheduling for LLM-bound work.
+
+Each upstream provider gets a fixed number of concurrency slots. Work that
+finds every slot busy waits in a bounded priority queue; higher-priority
+classes are handed a freed slot first:
+
+    FINISH       translating an answer that is already computed
+    INTERACTIVE  /api/chat
+    BATCH        /api/chat/batch
+    BACKGROUND   cache refresh and prewarming
+
+Waiting is bounded by the request deadline (resilience.deadline). A request
+whose estimated wait — queue position × recent slot hold time / slots — is
+already past its deadline, or that finds the queue full, is rejected at once
+with ``Overloaded`` (served as 429 + Retry-After) instead of timing out later.
+
+Cache hits and the structured /api/stats endpoints never take a slot, so they
+are served immediately however long the LLM queues are.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import resilience
+
+FINISH, INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2, 3
+PRIORITY_NAMES = {FINISH: "finish", INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+
+class Overloaded(RuntimeError):
+    """No slot can be had in time; retry after ``retry_after`` seconds."""
+
+    def __init__(self, name: str, retry_after: float, reason: str):
+        super().__init__(f"{name} overloaded: {reason}")
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Run the enclosed work (and tasks/threads it starts) at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Scheduler:
+    """Slots plus a bounded priority queue for one provider (event-loop only)."""
+
+    def __init__(self, name: str, slots: int, max_queue: int, initial_hold_s: float = 1.0):
+        self.name = name
+        self.slots = slots
+        self.max_queue = max_queue
+        self._in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._hold_s = initial_hold_s  # moving average of slot hold time
+        self.stats = {"admitted": 0, "waited": 0, "shed": 0, "timed_out": 0}
+
+    def _queued(self, up_to_priority: int = BACKGROUND) -> int:
+        return sum(1 for p, _, f in self._waiters if p <= up_to_priority and not f.done())
+
+    def estimated_wait(self, level: int) -> float:
+        ahead = self._queued(level)
+        if self._in_use < self.slots and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self._hold_s / self.slots
+
+    def _shed(self, reason: str, wait: float):
+        self.stats["shed"] += 1
+        return Overloaded(self.name, wait, reason)
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free and nobody is waiting; never queues."""
+        if self._in_use < self.slots and self._queued() == 0:
+            self._in_use += 1
+            self.stats["admitted"] += 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        level = _priority.get()
+        if self.try_acquire():
+            return
+
+        wait = self.estimated_wait(level)
+        left = resilience.time_left()
+        if self._queued() >= self.max_queue:
+            raise self._shed("queue full", wait)
+        if left is not None and wait > left:
+            raise self._shed(f"estimated wait {wait:.1f}s exceeds deadline", wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), future))
+        self.stats["waited"] += 1
+        try:
+            if left is None:
+                await future
+            else:
+                await asyncio.wait_for(future, max(0.0, left))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release()  # a slot was handed over as we gave up
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timed_out"] += 1
+                raise Overloaded(self.name, self.estimated_wait(level), "deadline reached in queue")
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # the slot passes straight to the waiter
+                return
+        self._in_use -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_s = 0.8 * self._hold_s + 0.2 * (time.monotonic() - start)
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "in_use": self._in_use,
+            "queued": {name: sum(1 for p, _, f in self._waiters if p == level and not f.done())
+                       for level, name in PRIORITY_NAMES.items()},
+            "avg_hold_ms": round(self._hold_s * 1000),
+            **self.stats,
+        }
+
+
+GROQ = Scheduler(
+    "groq",
+    slots=int(os.getenv("LLM_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("LLM_QUEUE_MAX", "64")),
+    initial_hold_s=3.0,
+)
+GEMINI = Scheduler(
+    "gemini",
+    slots=int(os.getenv("TRANSLATION_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("TRANSLATION_QUEUE_MAX", "64")),
+    initial_hold_s=1.0,
+)
+SCHEDULERS = {s.name: s for s in (GROQ, GEMINI)}
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    return {name: s.snapshot() for name, s in SCHEDULERS.items()}
@@ -1,14 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hmac
+import json
+import os
 import time
 from typing import List, Optional
 import traceback
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+import analytics
+import answer_cache
+import conversation
+import export
+import prewarm
+import profiler
 import rag_pipeline
+import resilience
+import scheduler
+import speculative_router
+import sql_templates
+import usage
 from translation_service import (
     translate_query_to_english,
     translate_response_to_language,
@@ -28,6 +45,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Structured, LLM-free analytics endpoints (/api/stats, /api/trend, /api/top)
+app.include_router(analytics.router)
+# Full result sets of answers as Arrow / Parquet / CSV (/api/export)
+app.include_router(export.router)
+
+
 # Request & Response Models
 class ChatMessage(BaseModel):
     role: str
@@ -45,11 +68,48 @@ class ChatResponse(BaseModel):
     latency_ms: int
     original_query: Optional[str] = None
     translated_query: Optional[str] = None
+    cached: bool = False
+    degraded: bool = False
+    profile: Optional[dict] = None
+
+
+# Fire-and-forget work (cache fills etc.) kept referenced until done.
+_background_tasks = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@app.on_event("startup")
+async def _load_data():
+    # Answer-cache keys (data_version), stats and the first question all need
+    # the engine; load the CSVs here, off the event loop, before serving.
+    try:
+        await asyncio.to_thread(rag_pipeline.get_engine)
+    except Exception as e:
+        print(f"⚠ Data load failed at startup: {e}")
+
+
+@app.on_event("startup")
+async def _warm_analytics():
+    _spawn(asyncio.to_thread(analytics.warm))
 
 
 @app.get("/api/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "providers": resilience.status(),
+        "queues": scheduler.status(),
+        "llm_usage": usage.totals(),
+        "speculation": speculative_router.status(),
+        "sql_templates": sql_templates.status(),
+        "prewarm": prewarm.last_report,
+    }
 
 
 @app.get("/api/languages")
@@ -57,61 +117,223 @@ def get_supported_languages():
     return {"languages": SUPPORTED_LANGUAGES}
 
 
+def _log_turn(sid: str, question: str, language: str, result: dict, latency_ms: int,
+              spend: Optional[usage.Usage] = None) -> None:
+    cost = spend.summary() if spend is not None else {}
+    try:
+        engine = rag_pipeline.get_engine()
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO chat_logs (session_id, role, content, sql_query, latency_ms, language)
+                VALUES (:sid, 'user', :content, NULL, NULL, :language)
+            """), {"sid": sid, "content": question, "language": language})
+
+            conn.execute(text("""
+                INSERT INTO chat_logs (session_id, role, content, sql_query, latency_ms,
+                                       llm_calls, prompt_tokens, completion_tokens, llm_ms, llm_usage,
+                                       language)
+                VALUES (:sid, 'assistant', :content, :sql, :lat,
+                        :calls, :prompt_tokens, :completion_tokens, :llm_ms, :llm_usage, :language)
+            """), {
+                "sid": sid,
+                "content": result["response"],
+                "sql": result.get("sql_query"),
+                "lat": latency_ms,
+                "calls": cost.get("llm_calls"),
+                "prompt_tokens": cost.get("prompt_tokens"),
+                "completion_tokens": cost.get("completion_tokens"),
+                "llm_ms": cost.get("llm_ms"),
+                "llm_usage": json.dumps(cost["stages"]) if cost else None,
+                "language": language,
+            })
+    except Exception as e:
+        print(f"⚠ Logging Warning: {e}")
+
+
 # ------------------------------
 # MAIN CHAT ENDPOINT (ASYNC)
 # ------------------------------
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    if not req.messages:
-        raise HTTPException(status_code=400, detail="messages cannot be empty")
+_answer_cache = answer_cache.AnswerCache()
 
-    user_language = req.language or "en"
-    user_message = req.messages[-1].content.strip()
+# Budget for one /api/chat answer; upstream calls give up (and fall back)
+# rather than run past it.
+CHAT_DEADLINE_S = float(os.getenv("CHAT_DEADLINE_S", "30"))
 
-    original_query = user_message
-    translated_query = user_message
-    start = time.perf_counter()
+DEGRADED_RESPONSE = (
+    "The assistant can't reach its language model right now, so this question "
+    "couldn't be answered. Please try again in a minute. Dashboards under "
+    "/api/stats, /api/trend and /api/top keep working."
+)
 
-    try:
-        # 1. Translate input
-        if user_language != "en":
-            translated_query = translate_query_to_english(user_message, user_language)
 
-        # 2. Run RAG async
+async def _translate(fn, text_in: str, language: str) -> str:
+    """Run a (blocking) translation call in a Gemini slot."""
+    async with scheduler.GEMINI.slot():
+        return await asyncio.to_thread(fn, text_in, language)
+
+
+async def _answer(user_message: str, user_language: str, session_id: Optional[str]) -> dict:
+    """Translate in → RAG (or refinement of the session's last result) → translate out."""
+    # 1. Translate input
+    translated_query = user_message
+    if user_language != "en":
+        translated_query = await _translate(translate_query_to_english, user_message, user_language)
+
+    # 2. Run RAG async — follow-ups are first tried against the
+    #    session's cached previous result.
+    async with scheduler.GROQ.slot():
         try:
-            result = await rag_pipeline.aquery(translated_query)
+            result = await conversation.try_refine(session_id, translated_query)
+            if result is None:
+                question = conversation.contextualize(session_id, translated_query)
+                result = await rag_pipeline.aquery(question)
+                _spawn(asyncio.to_thread(
+                    conversation.remember, session_id, question, result.get("sql_query")
+                ))
         except Exception:
             traceback.print_exc()
             raise HTTPException(status_code=500, detail="RAG Pipeline Error")
 
-        # 3. Translate back
-        if user_language != "en":
-            result["response"] = translate_response_to_language(result["response"], user_language)
+    # 3. Translate back — ahead of new requests' work in the Gemini queue.
+    if user_language != "en":
+        with scheduler.priority(scheduler.FINISH):
+            result["response"] = await _translate(
+                translate_response_to_language, result["response"], user_language
+            )
+
+    result["translated_query"] = translated_query
+    return result
+
+
+def _stale_result(key) -> Optional[dict]:
+    """Cached answer at any age, marked degraded."""
+    cached = _answer_cache.peek(key)
+    if cached is None:
+        return None
+    return {"response": cached.response, "sql_query": cached.sql_query,
+            "translated_query": cached.english_query, "cached": True, "degraded": True}
+
+
+async def _fallback_answer(key, user_message: str, user_language: str) -> dict:
+    """Answer when the LLM provider is unavailable: any cached answer, else a template."""
+    stale = _stale_result(key)
+    if stale is not None:
+        return stale
+    response = DEGRADED_RESPONSE
+    if user_language != "en":
+        try:
+            with scheduler.priority(scheduler.FINISH):
+                response = await _translate(translate_response_to_language, response, user_language)
+        except scheduler.Overloaded:
+            pass
+    return {"response": response, "sql_query": None, "translated_query": user_message, "degraded": True}
+
+
+def _cache_answer(key, result: dict) -> None:
+    # Follow-ups depend on the session's previous answer, not just their text.
+    if result.get("refined") or conversation.is_follow_up(result["translated_query"]):
+        _answer_cache.refresh_failed(key)
+        return
+    _answer_cache.put(key, answer_cache.CachedAnswer(
+        response=result["response"],
+        sql_query=result.get("sql_query"),
+        english_query=result["translated_query"],
+    ))
+
+
+async def _revalidate(key, user_message: str, user_language: str) -> None:
+    try:
+        # Own usage scope: the refresh is not part of the request that found the entry stale.
+        with resilience.deadline(CHAT_DEADLINE_S, detach=True), scheduler.priority(scheduler.BACKGROUND), \
+                usage.track():
+            _cache_answer(key, await _answer(user_message, user_language, None))
+    except Exception as e:
+        _answer_cache.refresh_failed(key)
+        print(f"⚠ Answer cache refresh failed: {e}")
+
+
+def _cached_result(key, user_message: str, user_language: str) -> Optional[dict]:
+    """Cached answer as a pipeline result; schedules a refresh when stale."""
+    cached, needs_refresh = _answer_cache.get(key)
+    if cached is None:
+        return None
+    if needs_refresh:
+        _spawn(_revalidate(key, user_message, user_language))
+    return {
+        "response": cached.response,
+        "sql_query": cached.sql_query,
+        "translated_query": cached.english_query,
+        "cached": True,
+    }
+
+
+def _start_profiler(admin_token: Optional[str]) -> profiler.SamplingProfiler:
+    if not profiler.ADMIN_TOKEN or not hmac.compare_digest(admin_token or "", profiler.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="profiling requires a valid X-Admin-Token")
+    try:
+        return profiler.SamplingProfiler().start()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-        latency_ms = int((time.perf_counter() - start) * 1000)
 
-        # 4. Log to DuckDB
-        try:
-            engine = rag_pipeline._engine
-            with engine.begin() as conn:
-                sid = req.session_id or "default"
-
-                conn.execute(text("""
-                    INSERT INTO chat_logs (session_id, role, content, sql_query, latency_ms)
-                    VALUES (:sid, 'user', :content, NULL, NULL)
-                """), {"sid": sid, "content": original_query})
-
-                conn.execute(text("""
-                    INSERT INTO chat_logs (session_id, role, content, sql_query, latency_ms)
-                    VALUES (:sid, 'assistant', :content, :sql, :lat)
-                """), {
-                    "sid": sid,
-                    "content": result["response"],
-                    "sql": result.get("sql_query"),
-                    "lat": latency_ms
-                })
-        except Exception as e:
-            print(f"⚠ Logging Warning: {e}")
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(
+    req: ChatRequest,
+    profile: bool = Query(False, description="admin only: profile this request (skips the answer cache)"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    if not req.messages:
+        raise HTTPException(status_code=400, detail="messages cannot be empty")
+
+    user_language = req.language or "en"
+    user_message = req.messages[-1].content.strip()
+
+    original_query = user_message
+    start = time.perf_counter()
+    sampler = _start_profiler(x_admin_token) if profile else None
+
+    try:
+        # Calls and tokens this turn costs upstream, stored with it.
+        with usage.track() as spend:
+            key = _answer_cache.key(user_message, user_language)
+            # A profiled request runs the full pipeline.
+            result = None if sampler else _cached_result(key, user_message, user_language)
+            if result is not None:
+                # Follow-ups in this session refine the cached answer's result.
+                _spawn(asyncio.to_thread(
+                    conversation.remember, req.session_id, result["translated_query"], result["sql_query"]
+                ))
+            else:
+                try:
+                    with resilience.deadline(CHAT_DEADLINE_S):
+                        result = await _answer(user_message, user_language, req.session_id)
+                    _cache_answer(key, result)
+                except scheduler.Overloaded as e:
+                    # Shed: no slot within the deadline. A cached answer beats a 429.
+                    result = _stale_result(key)
+                    if result is None:
+                        raise HTTPException(status_code=429, detail=str(e),
+                                            headers={"Retry-After": e.retry_after_header})
+                except Exception as e:
+                    if not resilience.is_unavailable(e):
+                        raise
+                    print(f"⚠ Degraded answer: {e}")
+                    result = await _fallback_answer(key, user_message, user_language)
+
+            translated_query = result["translated_query"]
+            latency_ms = int((time.perf_counter() - start) * 1000)
+
+            # 4. Log to DuckDB
+            _log_turn(req.session_id or "default", original_query, user_language, result, latency_ms, spend)
+
+        profile_report = None
+        if sampler:
+            sampler.stop()
+            profile_report = {
+                **sampler.report(),
+                "llm_usage": spend.summary(),
+                "explain_analyze": await asyncio.to_thread(profiler.explain_analyze, result.get("sql_query")),
+            }
 
         return ChatResponse(
             response=result["response"],
@@ -119,42 +341,350 @@ async def chat(req: ChatRequest):
             latency_ms=latency_ms,
             original_query=original_query if user_language != "en" else None,
             translated_query=translated_query if user_language != "en" else None,
+            cached=result.get("cached", False),
+            degraded=result.get("degraded", False),
+            profile=profile_report,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if sampler:
+            sampler.stop()
+
+
+# ------------------------------
+# BATCH CHAT (JSON LINES)
+# ------------------------------
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+# Per-provider in-flight limits for one batch: Groq (routing/SQL/synthesis)
+# and Gemini (translation).
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_TRANSLATION_CONCURRENCY = int(os.getenv("BATCH_TRANSLATION_CONCURRENCY", "2"))
+
+
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None
+    content: str
+    language: Optional[str] = "en"
+
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion]
+    session_id: Optional[str] = None
+
+
+class _SharedCalls:
+    """Per-batch memo: concurrent callers with the same key share one call."""
+
+    def __init__(self):
+        self._futures = {}
+
+    async def run(self, key, factory):
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._futures[key] = future
+        # One caller going away must not cancel the shared call.
+        return await asyncio.shield(future)
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(req: BatchRequest):
+    """Answer many questions, streaming one JSON line per question as it finishes.
+
+    Identical (question, language) pairs run once. Every question moves through
+    translate-in → RAG → translate-out on its own, so stages of different
+    questions overlap, bounded by per-provider semaphores. RAG calls are also
+    shared by English text, so the same question asked in several languages
+    hits the LLM once. A final {"done": true, ...} line summarizes the batch.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions cannot be empty")
+    if len(req.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    translation_slots = asyncio.Semaphore(BATCH_TRANSLATION_CONCURRENCY)
+    shared = _SharedCalls()
+    sid = req.session_id or "batch"
+    batch_start = time.perf_counter()
+
+    async def translate(fn, text_in: str, language: str) -> str:
+        async def call():
+            async with translation_slots:
+                return await _translate(fn, text_in, language)
+        return await shared.run((fn.__name__, text_in, language), call)
+
+    async def answer(question: str) -> dict:
+        async def call():
+            async with llm_slots, scheduler.GROQ.slot():
+                # The deadline starts once a slot is free, not while queued.
+                with resilience.deadline(CHAT_DEADLINE_S):
+                    return await rag_pipeline.aquery(question)
+        return await shared.run(("rag", question), call)
+
+    async def process(key):
+        content, language = key
+        start = time.perf_counter()
+        try:
+            with usage.track() as spend:
+                cache_key = _answer_cache.key(content, language)
+                result = _cached_result(cache_key, content, language)
+                if result is not None:
+                    english = result["translated_query"]
+                else:
+                    english = content
+                    if language != "en":
+                        english = await translate(translate_query_to_english, content, language)
+                    try:
+                        result = dict(await answer(english))
+                    except Exception as e:
+                        if not resilience.is_unavailable(e):
+                            raise
+                        result = await _fallback_answer(cache_key, content, language)
+                    else:
+                        if language != "en":
+                            result["response"] = await translate(
+                                translate_response_to_language, result["response"], language
+                            )
+                        result["translated_query"] = english
+                        _cache_answer(cache_key, result)
+                latency_ms = int((time.perf_counter() - start) * 1000)
+                await asyncio.to_thread(_log_turn, sid, content, language, result, latency_ms, spend)
+            return key, {
+                "response": result["response"],
+                "sql_query": result.get("sql_query"),
+                "latency_ms": latency_ms,
+                "translated_query": english if language != "en" else None,
+                "cached": result.get("cached", False),
+                "degraded": result.get("degraded", False),
+            }
+        except scheduler.Overloaded as e:
+            return key, {"error": str(e), "retry_after": e.retry_after_header}
+        except Exception as e:
+            traceback.print_exc()
+            return key, {"error": str(e)}
+
+    # Dedupe identical (question, language) pairs, remembering every position.
+    positions = {}
+    for index, q in enumerate(req.questions):
+        key = (q.content.strip(), q.language or "en")
+        positions.setdefault(key, []).append((index, q.id))
+
+    async def stream():
+        # Batch work yields queue positions to interactive chat; tasks
+        # inherit the priority from the context they are created in.
+        with scheduler.priority(scheduler.BATCH):
+            tasks = [asyncio.ensure_future(process(key)) for key in positions]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, payload = await next_done
+                for index, qid in positions[key]:
+                    yield json.dumps({
+                        "index": index,
+                        "id": qid,
+                        "question": key[0],
+                        "language": key[1],
+                        **payload,
+                    }, default=str) + "\n"
+            yield json.dumps({
+                "done": True,
+                "questions": len(req.questions),
+                "unique": len(positions),
+                "wall_ms": int((time.perf_counter() - batch_start) * 1000),
+            }) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 # ------------------------------
 # CHAT HISTORY
 # ------------------------------
+def _encode_cursor(created_at, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return created_at, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
 @app.get("/api/history")
 def history(
     session_id: str = Query("default"),
-    limit: int = Query(50, le=500)
+    limit: int = Query(50, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
+    """Newest-first keyset pagination over (session_id, created_at, id).
+
+    The cursor bounds each page, so cost does not grow with how far back the
+    client has paged. DuckDB plans this as a sequential scan (no index is
+    used); what keeps it cheap is chat_logs being compacted in (session_id,
+    created_at, id) order on a schedule, so row-group min/max statistics skip
+    every other session. Rows appended since the last compaction are scanned
+    in full. Messages within a page are returned oldest-first.
+    """
+    params = [session_id]
+    after = ""
+    if cursor:
+        created_at, row_id = _decode_cursor(cursor)
+        after = """
+                  AND (created_at < CAST(? AS TIMESTAMP)
+                       OR (created_at = CAST(? AS TIMESTAMP) AND id < ?))"""
+        params += [created_at, created_at, row_id]
+
     try:
-        engine = rag_pipeline._engine
+        engine = rag_pipeline.get_engine()
         with engine.begin() as conn:
             rows = conn.exec_driver_sql(
-                """
-                SELECT session_id, role, content, sql_query, latency_ms, created_at
+                f"""
+                SELECT id, session_id, role, content, sql_query, latency_ms, created_at
                 FROM chat_logs
-                WHERE session_id = ?
-                ORDER BY created_at DESC
+                WHERE session_id = ?{after}
+                ORDER BY created_at DESC, id DESC
                 LIMIT ?
             """,
-                (session_id, limit),
+                tuple(params + [limit + 1]),
             ).fetchall()
 
-        messages = [dict(row._mapping) for row in rows]
-        return {"messages": list(reversed(messages))}
+        messages = [dict(row._mapping) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = messages[-1]
+            next_cursor = _encode_cursor(last["created_at"], last["id"])
 
+        return {"messages": list(reversed(messages)), "next_cursor": next_cursor}
+
+    except HTTPException:
+        raise
     except Exception as e:
         print("🔥 ERROR IN /api/history:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ------------------------------
+# CHAT LOG RETENTION
+# ------------------------------
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "0"))
+CHAT_RETENTION_INTERVAL_S = int(os.getenv("CHAT_RETENTION_INTERVAL_S", str(24 * 3600)))
+
+
+async def _retention_loop():
+    from chat_retention import archive_old_sessions
+
+    while True:
+        try:
+            result = await asyncio.to_thread(
+                archive_old_sessions, rag_pipeline.get_engine(), CHAT_RETENTION_DAYS
+            )
+            print(f"🗄 Chat retention: {result}")
+        except Exception as e:
+            print(f"⚠ Chat retention failed: {e}")
+        await asyncio.sleep(CHAT_RETENTION_INTERVAL_S)
+
+
+# History pages scan only the row groups of one session once chat_logs is
+# sorted; appended rows are not, so re-sort after enough of them (0 disables).
+CHAT_COMPACT_INTERVAL_S = int(os.getenv("CHAT_COMPACT_INTERVAL_S", "3600"))
+CHAT_COMPACT_MIN_NEW_ROWS = int(os.getenv("CHAT_COMPACT_MIN_NEW_ROWS", "10000"))
+
+
+async def _compaction_loop():
+    from chat_retention import compact_if_grown
+
+    while True:
+        await asyncio.sleep(CHAT_COMPACT_INTERVAL_S)
+        try:
+            remaining = await asyncio.to_thread(
+                compact_if_grown, rag_pipeline.get_engine(), CHAT_COMPACT_MIN_NEW_ROWS
+            )
+            if remaining is not None:
+                print(f"🗄 chat_logs compacted: {remaining} rows")
+        except Exception as e:
+            print(f"⚠ chat_logs compaction failed: {e}")
+
+
+@app.on_event("startup")
+async def _start_retention():
+    if CHAT_RETENTION_DAYS > 0:
+        _spawn(_retention_loop())
+    elif CHAT_COMPACT_INTERVAL_S > 0:
+        # Retention compacts after archiving; without it, compact on its own.
+        _spawn(_compaction_loop())
+
+
+# ------------------------------
+# DATA HOT RELOAD
+# ------------------------------
+# Seconds between checks of data/ingres for added/changed CSVs; 0 disables.
+DATA_WATCH_INTERVAL_S = float(os.getenv("DATA_WATCH_INTERVAL_S", "10"))
+
+
+async def _data_watch_loop():
+    while True:
+        await asyncio.sleep(DATA_WATCH_INTERVAL_S)
+        try:
+            await asyncio.to_thread(rag_pipeline.reload_if_changed, True)
+        except Exception as e:
+            print(f"⚠ Data reload failed: {e}")
+
+
+@app.on_event("startup")
+async def _start_data_watch():
+    if DATA_WATCH_INTERVAL_S > 0:
+        _spawn(_data_watch_loop())
+
+
+# ------------------------------
+# CACHE PREWARMING
+# ------------------------------
+def _is_warm(question: str, language: str) -> bool:
+    return _answer_cache.peek(_answer_cache.key(question, language)) is not None
+
+
+async def _warm_one(question: str, language: str, seconds_left: float) -> bool:
+    """Answer one logged question at background priority and cache it."""
+    key = _answer_cache.key(question, language)
+    with resilience.deadline(min(CHAT_DEADLINE_S, seconds_left), detach=True), \
+            scheduler.priority(scheduler.BACKGROUND):
+        result = await _answer(question, language, None)
+    _cache_answer(key, result)
+    return _answer_cache.peek(key) is not None
+
+
+async def _prewarm():
+    try:
+        await rag_pipeline.get_router()
+        questions = await asyncio.to_thread(prewarm.recent_questions, rag_pipeline.get_engine())
+        if not questions:
+            return
+        report = await prewarm.run(questions, _warm_one, _is_warm)
+    except Exception as e:
+        print(f"⚠ Cache prewarm skipped: {e}")
+        return
+    print(
+        f"🔥 Prewarmed {report['warmed']}/{report['candidates']} questions in {report['seconds']}s "
+        f"({report['tokens']} tokens, stopped by {report['stopped_by']}); "
+        f"cache covers {report['coverage']:.0%} of the last {report['window_days']} days' questions "
+        f"(was {report['coverage_before']:.0%})"
+    )
+
+
+@app.on_event("startup")
+async def _start_prewarm():
+    if prewarm.PREWARM_QUESTIONS > 0 and _answer_cache.max_entries > 0:
+        _spawn(_prewarm())
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
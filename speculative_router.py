@@ -0,0 +1,195 @@
+"""Speculative routing: start the tools' first stage while the selector decides.
+
+RouterQueryEngine is serial — selector LLM, then the chosen tool. Here the
+first stage of each tool starts at the same time as the selector:
+
+- SQL tool: text-to-SQL generation and execution (the SQL retriever);
+- glossary tool: the vector lookup (embedding + similarity).
+
+A branch that calls an LLM (text-to-SQL) needs a slot of its own in that
+provider's scheduler, next to the one the request already holds: it only
+starts if a slot is free right now and nobody is queued, and otherwise the
+tool runs after selection as with the plain router. Cancelling a losing
+branch is safe for the provider's breaker (resilience.Provider).
+
+When the selector answers, the chosen tool runs as usual but its retriever
+hands back the result already in flight (``PrefetchingRetriever``); the other
+branch is cancelled, or its result dropped if it had finished. The critical
+path becomes roughly max(selector, first stage) + synthesis instead of the sum.
+
+``status()`` reports how often each branch was used, how much finished work
+was thrown away (calls/tokens via usage.py) and the time overlapped with the
+selector. ``SPECULATIVE_ROUTING=0`` restores the plain router.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import usage
+
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "1") != "0"
+
+# (retriever id, query string) → speculative task, for the request in progress
+_pending: contextvars.ContextVar[Optional[Dict[Tuple[int, str], asyncio.Future]]] = contextvars.ContextVar(
+    "speculative_pending", default=None
+)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "queries": 0,
+    "used": {},            # tool name → times its speculative result was used
+    "no_slot": 0,          # branches not started: their provider had no free slot
+    "cancelled": 0,        # losing branches stopped before finishing
+    "wasted": 0,           # losing branches that finished anyway
+    "wasted_llm_calls": 0,
+    "wasted_tokens": 0,
+    "overlap_ms": 0.0,     # time the winning branch ran alongside the selector
+}
+
+
+def _count(**changes) -> None:
+    with _stats_lock:
+        for key, value in changes.items():
+            _stats[key] += value
+
+
+def _count_used(tool: str) -> None:
+    with _stats_lock:
+        _stats["used"][tool] = _stats["used"].get(tool, 0) + 1
+
+
+def status() -> Dict[str, Any]:
+    with _stats_lock:
+        queries = _stats["queries"]
+        return {
+            "enabled": SPECULATIVE_ROUTING,
+            **_stats,
+            "used": dict(_stats["used"]),
+            "overlap_ms": round(_stats["overlap_ms"]),
+            "avg_overlap_ms": round(_stats["overlap_ms"] / queries) if queries else 0,
+        }
+
+
+def _consume(task: asyncio.Future) -> None:
+    # Losing branches may fail; their errors are nobody's to handle.
+    if not task.cancelled():
+        task.exception()
+
+
+class PrefetchingRetriever:
+    """Retriever proxy that returns a result started speculatively for the same query."""
+
+    def __init__(self, inner: Any, method: str):
+        self._inner = inner
+        self._method = method
+        setattr(self, method, self._retrieve)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._inner, name)
+
+    def start(self, query: str) -> asyncio.Future:
+        from llama_index.core.schema import QueryBundle
+        return asyncio.ensure_future(getattr(self._inner, self._method)(QueryBundle(query)))
+
+    async def _retrieve(self, query_bundle, *args, **kwargs):
+        pending = _pending.get()
+        task = pending.pop((id(self), query_bundle.query_str), None) if pending else None
+        if task is not None:
+            return await task
+        return await getattr(self._inner, self._method)(query_bundle, *args, **kwargs)
+
+
+class Branch:
+    """The speculative first stage of one tool."""
+
+    def __init__(self, retriever: PrefetchingRetriever, query_for: Callable[[str], str], slots: Any = None):
+        self.retriever = retriever
+        self.query_for = query_for  # the exact query string the tool will retrieve with
+        self.slots = slots          # scheduler.Scheduler of the LLM the branch calls, if any
+
+
+class SpeculativeRouter:
+    """Drop-in for RouterQueryEngine.aquery with speculative first stages."""
+
+    def __init__(self, selector: Any, tools: List[Any], branches: Dict[int, Branch]):
+        self._selector = selector
+        self._tools = tools
+        self._metadatas = [tool.metadata for tool in tools]
+        self._branches = branches
+
+    async def _run(self, branch: Branch, query: str, spent: Dict[str, Any]) -> Any:
+        with usage.track(child=True) as branch_usage:
+            spent["usage"] = branch_usage
+            try:
+                return await branch.retriever.start(query)
+            finally:
+                spent["done"] = time.perf_counter()
+
+    async def aquery(self, q: Any) -> Any:
+        from llama_index.core.schema import QueryBundle
+
+        question = str(q)
+        start = time.perf_counter()
+        speculative: Dict[int, Tuple[asyncio.Future, str, Dict[str, Any]]] = {}
+        for index, branch in self._branches.items():
+            if branch.slots is not None:
+                if not branch.slots.try_acquire():
+                    _count(no_slot=1)
+                    continue
+            query = branch.query_for(question)
+            spent: Dict[str, Any] = {}
+            task = asyncio.ensure_future(self._run(branch, query, spent))
+            if branch.slots is not None:
+                # Released when the task ends, even if cancelled before it started.
+                task.add_done_callback(lambda _, slots=branch.slots: slots.release())
+            task.add_done_callback(_consume)
+            speculative[index] = (task, query, spent)
+
+        try:
+            selection = await self._selector.aselect(self._metadatas, QueryBundle(question))
+        except BaseException:
+            for task, _, _ in speculative.values():
+                task.cancel()
+            raise
+        selected_at = time.perf_counter()
+        chosen = selection.ind
+
+        _count(queries=1)
+        pending: Dict[Tuple[int, str], asyncio.Future] = {}
+        for index, (task, query, spent) in speculative.items():
+            if index == chosen:
+                pending[(id(self._branches[index].retriever), query)] = task
+                ran_until = min(spent.get("done", selected_at), selected_at)
+                _count(overlap_ms=(ran_until - start) * 1000)
+            else:
+                self._drop(task, spent)
+
+        token = _pending.set(pending)
+        try:
+            response = await self._tools[chosen].query_engine.aquery(question)
+        finally:
+            _pending.reset(token)
+            if chosen in speculative:
+                task, _, spent = speculative[chosen]
+                if pending:
+                    # The tool retrieved with a different query: nothing was reused.
+                    self._drop(task, spent)
+                else:
+                    _count_used(self._tools[chosen].metadata.name)
+
+        response.metadata = response.metadata or {}
+        response.metadata["selector_result"] = selection
+        return response
+
+    def _drop(self, task: asyncio.Future, spent: Dict[str, Any]) -> None:
+        if not task.done():
+            task.cancel()
+            _count(cancelled=1)
+            return
+        cost = spent["usage"].summary() if "usage" in spent else {}
+        _count(wasted=1, wasted_llm_calls=cost.get("llm_calls", 0),
+               wasted_tokens=cost.get("prompt_tokens", 0) + cost.get("completion_tokens", 0))
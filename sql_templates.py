@@ -0,0 +1,327 @@
+"""Parameterized SQL templates: repeat question shapes skip text-to-SQL.
+
+Generated SQL mostly differs in literals — ``state = 'Bihar'`` vs
+``'Rajasthan'``, ``rainfall > 1500`` vs ``> 1000``, ``year = 2023`` — because
+the questions do. After text-to-SQL succeeds, the question is reduced to a
+shape with typed slots ("what is the average rainfall in {state}") using
+entity_index for places and states, status words and numbers, and each slot
+value is looked up among the SQL's literals. When every slot is bound to a
+literal, the SQL is registered as a template with those literals as ``$n``
+parameters; literals not taken from the question (``100.0``, ``'worsened'``)
+stay part of the template.
+
+A later question with the same shape fills the parameters from its own slots
+and runs the template as a prepared DuckDB statement (``PREPARE`` once per
+pooled connection, then ``EXECUTE``), without the text-to-SQL LLM call. Only
+read-only SELECTs that ran and returned rows are registered. A binding that
+is ambiguous (a value matching two slots, or a number appearing twice in the
+SQL) is not, nor is SQL with a status, place or state literal the question
+didn't supply — ``IN ('critical', 'over_exploited')`` learned for "critical"
+would keep returning over-exploited areas for "safe". Templates are dropped
+when the data is reloaded.
+
+``SQL_TEMPLATES=0`` disables it. ``status()`` reports hits, misses and the
+registry size.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import rag_pipeline
+
+SQL_TEMPLATES = os.getenv("SQL_TEMPLATES", "1") != "0"
+SQL_TEMPLATES_MAX = int(os.getenv("SQL_TEMPLATES_MAX", "500"))
+
+_QUESTION_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z0-9]+")
+_SQL_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?|\s+|.""", re.S)
+
+# Question words for groundwater_status values, longest phrases first.
+STATUS_PHRASES = [
+    (("over", "exploited"), "over_exploited"),
+    (("semi", "critical"), "semi_critical"),
+    (("overexploited",), "over_exploited"),
+    (("semicritical",), "semi_critical"),
+    (("critical",), "critical"),
+    (("safe",), "safe"),
+]
+STATUS_VALUES = frozenset(value for _, value in STATUS_PHRASES)
+
+
+@dataclass(frozen=True)
+class Slot:
+    kind: str    # "place", "state", "status" or "number"
+    value: Any   # canonical stored value, or a float for numbers
+
+
+@dataclass
+class Template:
+    shape: str
+    sql: str                       # generated SQL with $1..$n for the bound literals
+    params: List[Tuple[int, str]]  # per $n: question slot index, literal type (str/int/float)
+    name: str                      # prepared statement name
+    hits: int = 0
+
+
+_lock = threading.Lock()
+_templates: "OrderedDict[str, Template]" = OrderedDict()
+_stats: Dict[str, int] = {"learned": 0, "rejected": 0, "hits": 0, "misses": 0, "prepared": 0, "errors": 0}
+
+
+def _count(**changes) -> None:
+    with _lock:
+        for key, value in changes.items():
+            _stats[key] += value
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {"enabled": SQL_TEMPLATES, "templates": len(_templates), **_stats}
+
+
+def clear() -> None:
+    with _lock:
+        _templates.clear()
+
+
+# Templates were validated against the old tables; relearn them after a reload.
+rag_pipeline.on_reload(lambda version: clear())
+
+
+# --------------------------------------------------------------------------
+# Question shapes
+# --------------------------------------------------------------------------
+def _find(tokens: List[str], words: List[str], taken: set) -> Optional[int]:
+    n = len(words)
+    for start in range(len(tokens) - n + 1):
+        if tokens[start:start + n] == words and not taken & set(range(start, start + n)):
+            return start
+    return None
+
+
+def parse_question(question: str) -> Optional[Tuple[str, List[Slot]]]:
+    """(shape, slots) of a question; None if a resolved name can't be placed."""
+    import entity_index
+
+    tokens = _QUESTION_TOKEN.findall(question.lower())
+    spans: Dict[int, Tuple[int, Slot]] = {}  # start token → (length, slot)
+    taken: set = set()
+
+    def take(start: int, length: int, slot: Slot) -> None:
+        spans[start] = (length, slot)
+        taken.update(range(start, start + length))
+
+    for r in entity_index.resolve(question):
+        words = r.text.split()
+        start = _find(tokens, words, taken)
+        if start is None:
+            return None
+        take(start, len(words), Slot(r.entity.kind, r.entity.value))
+    for words, value in STATUS_PHRASES:
+        while (start := _find(tokens, list(words), taken)) is not None:
+            take(start, len(words), Slot("status", value))
+    for i, token in enumerate(tokens):
+        if i not in taken and token[0].isdigit() and re.fullmatch(r"\d+(?:\.\d+)?", token):
+            take(i, 1, Slot("number", float(token)))
+
+    shape, slots, i = [], [], 0
+    while i < len(tokens):
+        if i in spans:
+            length, slot = spans[i]
+            shape.append("{" + slot.kind + "}")
+            slots.append(slot)
+            i += length
+        else:
+            shape.append(tokens[i])
+            i += 1
+    return " ".join(shape), slots
+
+
+# --------------------------------------------------------------------------
+# SQL literals ↔ slots
+# --------------------------------------------------------------------------
+def _literal(token: str) -> Optional[Tuple[Any, str]]:
+    if len(token) >= 2 and token[0] == token[-1] == "'":
+        return token[1:-1].replace("''", "'"), "str"
+    if token[0].isdigit():
+        return float(token), ("float" if "." in token else "int")
+    return None
+
+
+def _matches(slot: Slot, value: Any, kind: str) -> bool:
+    if kind == "str":
+        return slot.kind != "number" and str(slot.value).lower() == value.lower()
+    return slot.kind == "number" and slot.value == value
+
+
+def _render(value: Any, kind: str) -> Optional[str]:
+    """SQL literal for a slot value in the type the template was learned with."""
+    if kind == "str":
+        return "'" + str(value).replace("'", "''") + "'"
+    if kind == "int":
+        return str(int(value)) if float(value).is_integer() else None
+    return repr(float(value))
+
+
+def _question_value(value: str) -> bool:
+    """A string the question should have supplied: a status, place or state."""
+    import entity_index
+    return value.lower() in STATUS_VALUES or entity_index.is_known(value)
+
+
+def learn(question: str, sql: str) -> Optional[Template]:
+    """Register ``sql`` as the template for the question's shape, if it binds cleanly."""
+    if not rag_pipeline.is_read_only_select(sql):
+        return None
+    parsed = parse_question(question)
+    if parsed is None:
+        return None
+    shape, slots = parsed
+
+    out: List[str] = []
+    params: List[Tuple[int, str]] = []
+    for token in _SQL_TOKEN.findall(sql.strip().rstrip(";").strip()):
+        literal = _literal(token)
+        if literal is None:
+            out.append(token)
+            continue
+        value, kind = literal
+        bound = [i for i, slot in enumerate(slots) if _matches(slot, value, kind)]
+        if len(bound) > 1:
+            _count(rejected=1)
+            return None
+        if not bound:
+            if kind == "str" and _question_value(value):
+                # e.g. IN ('critical', 'over_exploited') for "critical": the
+                # extra status would stay fixed for "safe" too.
+                _count(rejected=1)
+                return None
+            out.append(token)
+            continue
+        if kind != "str" and any(i == bound[0] for i, _ in params):
+            # The same number twice ("* 100.0 ... > 100") can't be told apart.
+            _count(rejected=1)
+            return None
+        params.append((bound[0], kind))
+        out.append(f"${len(params)}")
+
+    if {i for i, _ in params} != set(range(len(slots))):
+        # A question value the SQL doesn't use: other values would give the same SQL.
+        _count(rejected=1)
+        return None
+
+    text = "".join(out)
+    name = "tpl_" + hashlib.sha1(text.encode()).hexdigest()[:12]
+    template = Template(shape, text, params, name)
+    with _lock:
+        _templates[shape] = template
+        _templates.move_to_end(shape)
+        while len(_templates) > SQL_TEMPLATES_MAX:
+            _templates.popitem(last=False)
+        _stats["learned"] += 1
+    return template
+
+
+def match(question: str) -> Optional[Tuple[Template, List[str]]]:
+    """The template for the question's shape and its parameter literals."""
+    parsed = parse_question(question)
+    if parsed is None:
+        return None
+    shape, slots = parsed
+    with _lock:
+        template = _templates.get(shape)
+        if template is not None:
+            _templates.move_to_end(shape)
+    if template is None:
+        return None
+    args = [_render(slots[i].value, kind) for i, kind in template.params]
+    if any(arg is None for arg in args):
+        return None
+    return template, args
+
+
+def render_sql(template: Template, args: List[str]) -> str:
+    """The template with its parameters inlined, for logs and follow-ups."""
+    return re.sub(r"\$(\d+)", lambda m: args[int(m.group(1)) - 1], template.sql)
+
+
+def execute(template: Template, args: List[str]) -> Tuple[List[tuple], List[str]]:
+    """Run the template as a prepared statement on a pooled connection."""
+    raw_conn = rag_pipeline.get_engine().raw_connection()
+    try:
+        con = raw_conn.driver_connection
+        prepared = raw_conn.info.setdefault("sql_templates", set())
+        if template.name not in prepared:
+            con.execute(f"PREPARE {template.name} AS {template.sql}")
+            prepared.add(template.name)
+            _count(prepared=1)
+        cursor = con.execute(f"EXECUTE {template.name}({', '.join(args)})" if args else f"EXECUTE {template.name}")
+        rows = cursor.fetchall()
+        columns = [d[0] for d in cursor.description]
+    finally:
+        raw_conn.close()
+    return rows, columns
+
+
+# --------------------------------------------------------------------------
+# Text-to-SQL retriever proxy
+# --------------------------------------------------------------------------
+class TemplateRetriever:
+    """NLSQLRetriever proxy: known question shapes run their template, others are learned."""
+
+    def __init__(self, inner: Any, sql_database: Any, question_of: Callable[[str], str]):
+        self._inner = inner
+        self._sql_database = sql_database
+        self._question_of = question_of  # text-to-SQL prompt → the user's question
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._inner, name)
+
+    def _run(self, question: str) -> Optional[Tuple[List[Any], Dict[str, Any]]]:
+        from llama_index.core.schema import NodeWithScore, TextNode
+
+        hit = match(question)
+        if hit is None:
+            _count(misses=1)
+            return None
+        template, args = hit
+        rows, columns = execute(template, args)
+        db = self._sql_database
+        rows = [tuple(db.truncate_word(v, length=db._max_string_length) for v in row) for row in rows]
+        sql = render_sql(template, args)
+        template.hits += 1
+        _count(hits=1)
+        print(f"🧩 SQL template {template.name}: {template.shape}")
+        node = TextNode(
+            text=str(rows),
+            metadata={"sql_query": sql, "result": rows, "col_keys": columns},
+            excluded_embed_metadata_keys=["sql_query", "result", "col_keys"],
+            excluded_llm_metadata_keys=["sql_query", "result", "col_keys"],
+        )
+        return [NodeWithScore(node=node)], {
+            "sql_query": sql, "result": rows, "col_keys": columns, "sql_template": template.name,
+        }
+
+    async def aretrieve_with_metadata(self, str_or_query_bundle, *args, **kwargs):
+        query = getattr(str_or_query_bundle, "query_str", str_or_query_bundle)
+        question = self._question_of(query)
+        try:
+            hit = self._run(question)
+        except Exception as e:
+            _count(errors=1)
+            print(f"⚠ SQL template skipped: {e}")
+            hit = None
+        if hit is not None:
+            return hit
+
+        nodes, metadata = await self._inner.aretrieve_with_metadata(str_or_query_bundle, *args, **kwargs)
+        if metadata.get("result") and metadata.get("sql_query"):
+            try:
+                learn(question, metadata["sql_query"])
+            except Exception as e:
+                print(f"⚠ SQL template not learned: {e}")
+        return nodes, metadata
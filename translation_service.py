@@ -5,11 +5,14 @@ Hindi, Marathi, Bengali, Tamil, Telugu, Gujarati
 """
 
 import os
+import threading
 import time
 import logging
 from typing import Dict, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+import resilience
+import usage
 
 
 load_dotenv()
@@ -28,42 +31,66 @@ SUPPORTED_LANGUAGES = {
 }
 
 class TranslationService:
-    def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        
-        # Configure Gemini
-        genai.configure(api_key=self.api_key)
-        self.model = "gemini-1.5-flash"
+    def __init__(self, model=None):
+        """Create the service.
+
+        ``model`` may be any object exposing ``generate_content(prompt)``
+        returning something with a ``.text`` attribute (e.g. a local stand-in
+        used by benchmark.py). When omitted, a Gemini model is configured.
+        """
+        self.model_name = "gemini-1.5-flash"
+        if model is None:
+            self.api_key = os.getenv("GOOGLE_API_KEY")
+            if not self.api_key:
+                raise ValueError("GOOGLE_API_KEY not found in environment variables")
+
+            # Imported here: the Gemini SDK is slow to import and unused
+            # when a stand-in model is passed.
+            import google.generativeai as genai
+
+            # Configure Gemini
+            genai.configure(api_key=self.api_key)
+            model = genai.GenerativeModel(self.model_name)
+        self.model = model
         
         # Rate limiting
         self.last_request_time = 0
         self.min_request_interval = 1.0  # 1 second between requests to avoid rate limits
+        self._rate_lock = threading.Lock()  # calls may come from worker threads
     
     def _wait_for_rate_limit(self):
         """Ensure we don't exceed rate limits"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
+        with self._rate_lock:
+            current_time = time.time()
+            time_since_last = current_time - self.last_request_time
+            if time_since_last < self.min_request_interval:
+                sleep_time = self.min_request_interval - time_since_last
+                time.sleep(sleep_time)
+            self.last_request_time = time.time()
     
+    def _generate(self, prompt: str, stage: str) -> str:
+        """One Gemini call with deadline and circuit breaker (not hedged: rate-limited).
+
+        Raises resilience.ProviderUnavailable; callers fall back to the
+        untranslated text, immediately while the breaker is open. The call is
+        accounted to ``stage`` in the request's usage (usage.py).
+        """
+        def attempt():
+            self._wait_for_rate_limit()
+            return self.model.generate_content(prompt)
+
+        start = time.perf_counter()
+        response = resilience.GEMINI.call(attempt)
+        result = response.text.strip()
+        usage.record(stage, self.model_name, time.perf_counter() - start,
+                     prompt, result, usage.reported_tokens(response))
+        return result
+
     def translate_to_english(self, text: str, source_language: str) -> str:
         """Translate text from source language to English"""
         if source_language == 'en':
             return text
-        try:
-            # New SDK syntax: client.models.generate_content
-            response = self.client.models.generate_content(
-                model=self.model_id, 
-                contents=f"Translate this to English: {text}"
-            )
-            return response.text.strip()
-        except Exception as e:
-            return text # Safe fallback
-        
+
         source_lang_name = SUPPORTED_LANGUAGES.get(source_language, source_language)
         
         prompt = f"""
@@ -75,9 +102,7 @@ Keep the translation accurate and natural. If it's a question about groundwater,
 English translation:"""
         
         try:
-            self._wait_for_rate_limit()
-            response = self.model.generate_content(prompt)
-            translation = response.text.strip()
+            translation = self._generate(prompt, "translate_in")
             
             logger.info(f"Translated from {source_lang_name} to English: {text[:50]}... -> {translation[:50]}...")
             return translation
@@ -104,9 +129,7 @@ English text: {text}
 {target_lang_name} translation:"""
         
         try:
-            self._wait_for_rate_limit()
-            response = self.model.generate_content(prompt)
-            translation = response.text.strip()
+            translation = self._generate(prompt, "translate_out")
             
             logger.info(f"Translated from English to {target_lang_name}: {text[:50]}... -> {translation[:50]}...")
             return translation
@@ -135,9 +158,7 @@ Text: {text}
 Language code:"""
         
         try:
-            self._wait_for_rate_limit()
-            response = self.model.generate_content(prompt)
-            detected_lang = response.text.strip().lower()
+            detected_lang = self._generate(prompt, "detect_language").lower()
             
             # Validate the response
             if detected_lang in SUPPORTED_LANGUAGES:
@@ -160,6 +181,11 @@ def get_translation_service() -> TranslationService:
         _translation_service = TranslationService()
     return _translation_service
 
+def set_translation_service(service: Optional[TranslationService]) -> None:
+    """Replace the global translation service (None resets to lazy Gemini)"""
+    global _translation_service
+    _translation_service = service
+
 def translate_query_to_english(query: str, source_language: str = 'auto') -> str:
     """Convenience function to translate query to English"""
     service = get_translation_service()
@@ -0,0 +1,147 @@
+"""Per-request accounting of LLM and translation calls.
+
+Every Groq call (per pipeline stage: selector, sql, synthesis) and every
+Gemini call (translate_in, translate_out, detect_language) is recorded with
+its model, prompt/completion tokens and wall time:
+
+- into the current request's ``Usage`` (opened with ``track()``; it flows into
+  tasks and worker threads like the deadline does), which server.py stores
+  with the assistant turn in ``chat_logs``;
+- into process-wide per-stage totals, reported by ``/api/health``.
+
+Token counts come from the provider's response. Backends that report none
+(local GGUF/ONNX models, benchmark stand-ins) are estimated at ~4 characters
+per token and flagged ``estimated``. A call is one logical request: a hedged
+duplicate attempt is not counted again (see the provider stats for those).
+"""
+
+import contextlib
+import contextvars
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+CHARS_PER_TOKEN = 4
+
+_current: contextvars.ContextVar[Optional["Usage"]] = contextvars.ContextVar("usage", default=None)
+
+
+def _empty() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "wall_ms": 0.0,
+            "estimated": False, "models": {}}
+
+
+def _add(totals: Dict[str, Any], model: str, prompt_tokens: int, completion_tokens: int,
+         seconds: float, estimated: bool) -> None:
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["wall_ms"] += seconds * 1000
+    totals["estimated"] |= estimated
+    totals["models"][model] = totals["models"].get(model, 0) + 1
+
+
+def _rounded(stages: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {stage: {**t, "wall_ms": round(t["wall_ms"]), "models": dict(t["models"])}
+            for stage, t in stages.items()}
+
+
+class Usage:
+    """Calls and tokens per stage for one request (thread-safe).
+
+    A child scope (part of a request, e.g. one speculative branch) also adds
+    everything to its parent.
+    """
+
+    def __init__(self, parent: Optional["Usage"] = None):
+        self.parent = parent
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int,
+            seconds: float, estimated: bool) -> None:
+        with self._lock:
+            _add(self._stages.setdefault(stage, _empty()), model, prompt_tokens,
+                 completion_tokens, seconds, estimated)
+        if self.parent is not None:
+            self.parent.add(stage, model, prompt_tokens, completion_tokens, seconds, estimated)
+
+    def stages(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return _rounded(self._stages)
+
+    def summary(self) -> Dict[str, Any]:
+        """Request totals plus the per-stage breakdown (what chat_logs stores)."""
+        stages = self.stages()
+        return {
+            "llm_calls": sum(t["calls"] for t in stages.values()),
+            "prompt_tokens": sum(t["prompt_tokens"] for t in stages.values()),
+            "completion_tokens": sum(t["completion_tokens"] for t in stages.values()),
+            "llm_ms": sum(t["wall_ms"] for t in stages.values()),
+            "stages": stages,
+        }
+
+
+_totals: Dict[str, Dict[str, Any]] = {}
+_totals_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def track(child: bool = False):
+    """Open a fresh ``Usage`` for the enclosed request and yield it.
+
+    With ``child`` the scope measures part of the current request instead of
+    replacing it.
+    """
+    usage = Usage(_current.get() if child else None)
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def record(stage: str, model: str, seconds: float, prompt: str, completion: str,
+           reported: Optional[Tuple[int, int]] = None) -> None:
+    """Account one call; ``reported`` is (prompt, completion) tokens from the provider."""
+    estimated = reported is None
+    if estimated:
+        reported = (estimate_tokens(prompt), estimate_tokens(completion))
+    prompt_tokens, completion_tokens = reported
+
+    usage = _current.get()
+    if usage is not None:
+        usage.add(stage, model, prompt_tokens, completion_tokens, seconds, estimated)
+    with _totals_lock:
+        _add(_totals.setdefault(stage, _empty()), model, prompt_tokens, completion_tokens,
+             seconds, estimated)
+
+
+def totals() -> Dict[str, Dict[str, Any]]:
+    """Per-stage totals since start."""
+    with _totals_lock:
+        return _rounded(_totals)
+
+
+def _field(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def reported_tokens(response: Any) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens reported in an LLM or Gemini response, if any."""
+    # LlamaIndex (OpenAI-compatible, e.g. Groq): additional_kwargs or raw.usage
+    kwargs = _field(response, "additional_kwargs") or {}
+    if kwargs.get("prompt_tokens") is not None:
+        return int(kwargs["prompt_tokens"]), int(kwargs.get("completion_tokens") or 0)
+    raw = _field(response, "raw")
+    usage = _field(raw, "usage") if raw is not None else None
+    if usage is not None and _field(usage, "prompt_tokens") is not None:
+        return int(_field(usage, "prompt_tokens")), int(_field(usage, "completion_tokens") or 0)
+    # Gemini: usage_metadata
+    meta = _field(response, "usage_metadata")
+    if meta is not None and _field(meta, "prompt_token_count") is not None:
+        return int(_field(meta, "prompt_token_count")), int(_field(meta, "candidates_token_count") or 0)
+    return None